@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""핫패스 마이크로벤치마크. 가짜 시트/마스토돈(fakes)이라 자격 증명 없이 돈다.
+
+    python -m shop_marchend.bench [--sizes 100,1000,10000] [--sec 1.0]
+
+규모 N마다 유저 N명(가방 열), 구매기록·아르바이트·레시피·유저목록 N행을 채운 문서로 Sheets를 띄우고,
+각 연산의 ops/sec와 연산당 시트 API 호출 수(쓰기 큐를 다 비운 뒤 기준)를 찍는다."""
+import argparse, os, random, tempfile, time
+from typing import Callable, List, Tuple
+
+from .config import Config
+from .fakes import FakeSpreadsheet
+from .sheets import Sheets
+from .service import ShopService
+from .commands import Parser
+from .utils_time import now_ts, today_str
+
+N_SHOP  = 200   # 상점 물품 수
+N_BAG   = 20    # 가방에 미리 채워 둘 아이템 행 수
+N_GACHA = 50    # 가챠 테이블 행 수
+GACHA_ITEM = "뽑기상자"   # 사용하면 '상자' 테이블을 굴리는 상점 물품
+
+def build(n: int, seed: int = 1) -> Tuple[FakeSpreadsheet, Sheets, ShopService]:
+    rnd = random.Random(seed)
+    ss = FakeSpreadsheet()
+    items = [f"아이템{i}" for i in range(N_SHOP)]
+    accts = [f"user{i}" for i in range(n)]
+    today, ts = today_str(), now_ts()
+
+    def ws(title: str, rows: List[list]):
+        ss.add_worksheet(title, rows=max(1000, len(rows) + 100), cols=max(26, len(rows[0]) + 10)).fill(rows)
+
+    ws(Config.WS_SHOP, [["아이템명", "구매가", "판매가", "설명", "유형", "효과", "일일한도"]] +
+       [[it, 10, 5, f"{it} 설명", "NORMAL", "", 3 if i % 10 == 0 else 0] for i, it in enumerate(items)] +
+       [[GACHA_ITEM, 20, 5, "", "GACHA", "상자", 0]])
+    ws(Config.WS_INV, [["아이템명"] + accts,
+                       [Config.CURRENCY] + [1000] * n,
+                       [Config.HP_NAME] + [Config.HP_MAX] * n] +
+       [[it] + [rnd.randint(0, 5) for _ in range(n)] for it in items[:N_BAG] + [GACHA_ITEM]])
+    ws(Config.WS_RECIPE, [["출력아이템", "출력수량", "재료키"]] +
+       [[rnd.choice(items), 1, f"{items[i % N_SHOP]}-{items[(i * 7 + 1) % N_SHOP]}-{i}"] for i in range(n)])
+    ws(Config.WS_JOBS, [["유저", "닉네임", "날짜", "지급코인"]] +
+       [[accts[i % n], f"닉{i}", today, 5] for i in range(n)])
+    ws(Config.WS_PUBLIC_REC, [["출력아이템", "출력수량", "재료키", "발견자", "발견자닉", "날짜"]])
+    ws(Config.WS_PURCHASE, [["유저", "닉네임", "날짜", "아이템", "수량"]] +
+       [[rnd.choice(accts), "닉", ts, rnd.choice(items), 1] for _ in range(n)])
+    ws(Config.WS_GACHA, [["테이블", "보상아이템", "수량", "확률", "스크립트"]] +
+       [["상자", rnd.choice(items), 1, rnd.randint(1, 100), ""] for _ in range(N_GACHA)])
+    ws(Config.WS_USERS, [["아이디", "닉네임", "최초활동", "최근활동"]] +
+       [[a, f"닉{i}", ts, ts] for i, a in enumerate(accts)])
+
+    sh = Sheets(ss=ss)
+    svc = ShopService(sh)
+    return ss, sh, svc
+
+def measure(ss: FakeSpreadsheet, sh: Sheets, fn: Callable[[], object], sec: float) -> Tuple[float, float]:
+    """fn을 sec초 동안 돌려 (ops/sec, 연산당 API 호출 수). 쓰기는 큐가 빌 때까지 기다린 뒤 센다."""
+    before = ss.total_calls()
+    n = 0
+    t0 = time.perf_counter()
+    end = t0 + sec
+    while True:
+        for _ in range(100):
+            fn()
+        n += 100
+        if time.perf_counter() >= end:
+            break
+    dt = time.perf_counter() - t0
+    sh._wq_inv.join()
+    sh._wq_log.join()
+    sh.flush_users()
+    return n / dt, (ss.total_calls() - before) / n
+
+def cases(sh: Sheets, svc: ShopService, n: int, seed: int = 2):
+    rnd = random.Random(seed)
+    accts = [f"user{i}" for i in range(n)]
+    items = [f"아이템{i}" for i in range(N_SHOP)]
+    today = today_str()
+    parser = Parser()
+    texts = ["@shop [구매/아이템3*2-아이템7]", "@shop [상태]", "@shop [양도/user1:아이템2:3]",
+             "@shop [제작/아이템1-아이템8]", "그냥 멘션입니다. 명령이 없어요.", "@shop [아르바이트] 오늘도 출근"]
+    return [
+        ("shop_map",        lambda: svc.shop_map()),
+        ("balance",         lambda: svc.balance(rnd.choice(accts))),
+        ("add_item",        lambda: svc.add_item(rnd.choice(accts), rnd.choice(items[:N_BAG]), 1)),
+        ("gacha_roll",      lambda: svc.gacha_roll("상자")),
+        ("find_recipe",     lambda: sh.find_recipe([rnd.choice(items), rnd.choice(items)])),
+        ("purchases_today", lambda: sh.purchases_today(rnd.choice(accts), rnd.choice(items), today)),
+        ("Parser.parse",    lambda: parser.parse(rnd.choice(texts))),
+    ]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="100,1000,10000", help="유저/기록 행 수 목록(쉼표)")
+    ap.add_argument("--sec", type=float, default=1.0, help="연산별 측정 시간(초)")
+    args = ap.parse_args(argv)
+
+    # 저널/로컬 저장소/멘션 기록은 임시 폴더에 (현재 폴더를 더럽히지 않게)
+    tmp = tempfile.mkdtemp(prefix="shop-bench-")
+    journal = Config.JOURNAL_FILE
+    Config.SEEN_FILE = ""
+    Config.SHEETS_READ_PER_MIN = Config.SHEETS_WRITE_PER_MIN = 0   # 연산 자체의 속도를 잰다(한도 대기 제외)
+
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        Config.JOURNAL_FILE = os.path.join(tmp, f"journal-{n}.log") if journal else ""
+        Config.SQLITE_PATH = os.path.join(tmp, f"shop-{n}.db")
+        t0 = time.perf_counter()
+        ss, sh, svc = build(n)
+        print(f"\nN={n}  (startup {time.perf_counter() - t0:.2f}s, {ss.total_calls()} calls)")
+        print(f"  {'op':<16}{'ops/sec':>12}{'calls/op':>12}")
+        for name, fn in cases(sh, svc, n):
+            ops, cpo = measure(ss, sh, fn, args.sec)
+            print(f"  {name:<16}{ops:>12,.0f}{cpo:>12.4f}")
+
+if __name__ == "__main__":
+    main()
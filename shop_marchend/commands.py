@@ -1,28 +1,64 @@
 # -*- coding: utf-8 -*-
 import re, time, random, logging
 import html
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 from mastodon import StreamListener
 from collections import Counter
 
 from .config import Config
+from .lanes import Lanes
+from .seen import SeenStore
+from .metrics import METRICS
+from .tracing import TRACER
 from .masto import Bot
 from .sheets import Sheets
 from .service import ShopService
 from .utils_time import now_ts, today_str
 
 _ITEM_TOKEN = re.compile(r"^\s*(.+?)(?:\s*[x\*]\s*(\d+))?\s*$")
+_TAG = re.compile(r"<[^>]+>")
+
+# ---- 명령 객체 ----
+class Buy(NamedTuple):
+    items: List[Tuple[str, int]]   # [("아이템명", 수량), ...]
+
+class Use(NamedTuple):
+    item: str
+
+class Sell(NamedTuple):
+    items: List[Tuple[str, int]]
+
+class Give(NamedTuple):
+    target: str
+    thing: str
+    qty: int
+
+class Craft(NamedTuple):
+    ings: List[str]
+
+class Job(NamedTuple):
+    pass
+
+class Status(NamedTuple):
+    pass
+
+Command = Union[Buy, Use, Sell, Give, Craft, Job, Status]
 
 class Parser:
+    # 대괄호 명령 전부를 한 정규식으로 찾는다. 그룹 이름이 명령 종류
     # [양도/상대닉(or아이디):아이템명:개수]
-    RE_BUY    = re.compile(r"\[\s*구매\s*/\s*([^\]]+)\]")
-    RE_USE    = re.compile(r"\[\s*사용\s*/\s*([^\]]+)\]")
-    RE_SELL   = re.compile(r"\[\s*판매\s*/\s*([^\]]+)\]")
-    RE_GIVE   = re.compile(r"\[\s*양도\s*/\s*([^:\]]+)\s*:\s*([^:\]]+)\s*:\s*(\d+)\s*\]")
-    RE_CRAFT  = re.compile(r"\[\s*제작\s*/\s*([^\]]+)\]")
-    RE_JOB    = re.compile(r"\[\s*아르바이트\s*\]")
-    RE_STATUS = re.compile(r"\[\s*상태\s*\]")  # 추가: 상태 보기
+    RE_CMD = re.compile(
+        r"\[\s*(?:"
+        r"구매\s*/\s*(?P<buy>[^\]]+)"
+        r"|사용\s*/\s*(?P<use>[^\]]+)"
+        r"|판매\s*/\s*(?P<sell>[^\]]+)"
+        r"|양도\s*/\s*(?P<give>[^:\]]+)\s*:\s*(?P<thing>[^:\]]+)\s*:\s*(?P<qty>\d+)\s*"
+        r"|제작\s*/\s*(?P<craft>[^\]]+)"
+        r"|(?P<job>아르바이트)\s*"
+        r"|(?P<status>상태)\s*"  # 추가: 상태 보기
+        r")\]")
+    # 한 멘션에 명령이 여럿이면 앞쪽(우선순위 높은) 종류를 따른다
+    _RANK = {"buy": 0, "use": 1, "sell": 2, "give": 3, "craft": 4, "job": 5, "status": 6}
 
     @staticmethod
     def parse_item_list(s: str):
@@ -45,71 +81,76 @@ class Parser:
 
     @staticmethod
     def clean_html(t: str) -> str:
-        return re.sub(r"<[^>]+>", " ", t).strip()
+        return _TAG.sub(" ", t).strip()
 
     def has_command(self, t: str) -> bool:
-        return any([
-            self.RE_BUY.search(t),
-            self.RE_USE.search(t),
-            self.RE_SELL.search(t),
-            self.RE_GIVE.search(t),
-            self.RE_CRAFT.search(t),
-            self.RE_JOB.search(t),
-            self.RE_STATUS.search(t),
-        ])
-
-    def parse(self, t: str):
-        m = self.RE_BUY.search(t)
-
-        if m:
-            return {"cmd": "buy", "items": Parser.parse_item_list(m.group(1))}
-
-        m = self.RE_USE.search(t)
-
-        if m:
-            return {"cmd": "use", "item": m.group(1).strip()}
-
-        m = self.RE_SELL.search(t)
-
-        if m:
-            return {"cmd": "sell", "items": Parser.parse_item_list(m.group(1))}
-
-        m = self.RE_GIVE.search(t)
-
-        if m:
-            return {"cmd": "give", "target": m.group(1).strip(),
-                    "thing": m.group(2).strip(), "qty": int(m.group(3))}
-
-        m = self.RE_CRAFT.search(t)
-
-        if m:
-            parts = [p.strip() for p in m.group(1).split('-') if p.strip()]
-            return {"cmd": "craft", "ings": parts}
-
-        if self.RE_JOB.search(t):
-            return {"cmd": "job"}
-
-        if self.RE_STATUS.search(t):
-            return {"cmd": "status"}
-
-        return {"cmd": "unknown"}
+        return self.RE_CMD.search(t) is not None
+
+    def _best(self, t: str):
+        # 각 '[' 위치에서 한 번씩만 맞춰 보고(겹친 명령도 놓치지 않게), 가장 앞 순위의 것을 고른다
+        best, best_rank, pos = None, len(self._RANK), 0
+        while True:
+            m = self.RE_CMD.search(t, pos)
+            if m is None:
+                return best
+            rank = self._RANK.get(m.lastgroup, self._RANK["give"])  # 양도는 마지막 그룹이 qty
+            if rank < best_rank:
+                best, best_rank = m, rank
+                if rank == 0:
+                    return best
+            pos = m.start() + 1
+
+    def parse(self, t: str) -> Optional[Command]:
+        """명령 객체 하나를 돌려준다. 명령이 없으면 None."""
+        m = self._best(t)
+        if m is None:
+            return None
+        g = m.groupdict()
+        if g["buy"] is not None:
+            return Buy(Parser.parse_item_list(g["buy"]))
+        if g["use"] is not None:
+            return Use(g["use"].strip())
+        if g["sell"] is not None:
+            return Sell(Parser.parse_item_list(g["sell"]))
+        if g["give"] is not None:
+            return Give(g["give"].strip(), g["thing"].strip(), int(g["qty"]))
+        if g["craft"] is not None:
+            return Craft([p.strip() for p in g["craft"].split('-') if p.strip()])
+        if g["job"] is not None:
+            return Job()
+        return Status()
 
 
 class Dispatch:
-    """멘션 병렬 처리(스레드풀). 시트 쓰기는 Sheets 내부 분리 큐로 직렬/배치."""
+    """멘션 병렬 처리(acct별 레인). 시트 쓰기는 Sheets 내부 분리 큐로 직렬/배치."""
     def __init__(self, bot: Bot, svc: ShopService, sh: Sheets):
         self.bot = bot
         self.svc = svc
         self.sh  = sh
         self.parser = Parser()
-        self.exec = ThreadPoolExecutor(max_workers=Config.WORKERS)
+        self.exec = Lanes(Config.WORKERS)
+        # 처리한 멘션 기록(중복 처리 방지). 재시작하면 마지막 알림 id부터 따라잡는다
+        self.seen = SeenStore(Config.SEEN_FILE, Config.SEEN_MAX) if Config.SEEN_FILE else None
+        self.last_id = self.seen.last_notif if self.seen else None  # 마지막으로 받은 알림 id
+        METRICS.gauge("lanes", self.exec.depth)
 
     def _nick_from_status(self, st):
         dn = st.get("account", {}).get("display_name") or ""
-        dn = re.sub(r"<[^>]+>", "", dn)
+        dn = _TAG.sub("", dn)
         return html.unescape(dn).strip() or st.get("account", {}).get("acct", "")
 
+    def _mark_seen(self, notif_id):
+        if notif_id is None:
+            return
+        try:
+            newer = self.last_id is None or int(notif_id) > int(self.last_id)
+        except (TypeError, ValueError):
+            newer = True
+        if newer:
+            self.last_id = notif_id
+
     def on_notif(self, notif: dict):
+        self._mark_seen(notif.get("id"))
         if notif.get("type") != "mention":
             return
 
@@ -118,362 +159,380 @@ class Dispatch:
         if not st:
             return
 
+        t_recv = time.monotonic()
         acct = notif["account"]["acct"]  # @ 없이
         txt  = self.parser.clean_html(st["content"])
 
-        # 명령 형식이 아니면 조용히 무시
-        if not self.parser.has_command(txt):
+        # 한 번만 파싱한다. 명령 형식이 아니면 조용히 무시
+        cmd = self.parser.parse(txt)
+        if cmd is None:
             return
+        t_parsed = time.monotonic()
 
-        self.exec.submit(self._proc, st, acct, txt)
-
-    def _proc(self, st: dict, acct: str, text: str):
-        try:
-            p = self.parser.parse(text)
-            cmd = p["cmd"]
-
-            # 닉네임 확보
-            nick = self._nick_from_status(st)
-            ts = now_ts()  # KST 고정
-            self.sh.upsert_user(acct, nick, ts)
-
-            if cmd == "unknown": #인식할 수 있는 명령이 아니면 무시
-                return 
-
-            if cmd == "status":
-                bal = self.svc.balance(acct)
-                hp = self.svc.hp(acct)
-                return self.bot.reply(st,f"{nick}님의 상태 — {Config.CURRENCY}: {bal}, {Config.HP_NAME}: {hp}/{Config.HP_MAX}")
-
-            if cmd == "buy":
-                items = p["items"]  # [("아이템명",수량), ...]
-
-                if not items:
-                    return self.bot.reply(st, "구매하려는 항목이 비어 있습니다.")
-
-                mp = self.svc.shop_map()
-                unknown = [name for name, _ in items if name not in mp]
+        # 이미 처리한 멘션(재접속 따라잡기/중복 이벤트/재시작)이면 건너뜀
+        if self.seen is not None and not self.seen.add(st["id"], notif.get("id")):
+            return
 
-                if unknown:
-                    # 오류 2: 물품 미존재
+        # 같은 acct(양도는 상대 acct 포함)의 명령은 한 레인에서 순서대로 처리
+        keys = [acct]
+        if isinstance(cmd, Give):
+            keys.append(cmd.target)
+        tr = TRACER.start(st["id"], acct, t_recv)  # _proc·쓰기 큐·답변 힙이 status id로 찾아 이어 간다
+        if tr is not None:
+            tr.add("parse", t_recv, t_parsed)
+            tr.t_submit = time.monotonic()
+        self.exec.submit(keys, self._proc, st, acct, cmd)
+
+    # 명령 타입 -> 처리 메서드 이름 (하위 클래스에서 메서드만 바꿔 끼울 수 있게 이름으로 찾는다)
+    HANDLERS: Dict[type, str] = {
+        Buy: "_do_buy", Use: "_do_use", Sell: "_do_sell", Give: "_do_give",
+        Craft: "_do_craft", Job: "_do_job", Status: "_do_status",
+    }
+
+    def _proc(self, st: dict, acct: str, cmd: Command):
+        # 이 안에서 부른 API와 큐에 넣은 쓰기·답변은 이 명령 몫으로 세고, 같은 추적에 구간을 남긴다
+        name = type(cmd).__name__.lower()
+        tr = TRACER.get(st.get("id"))
+        if tr is not None:
+            tr.cmd = name
+            tr.add("lane_wait", tr.t_submit, time.monotonic())
+        with METRICS.command(name), TRACER.activate([tr]), TRACER.span("proc"), TRACER.profiled(tr):
+            try:
+                # 닉네임 확보
+                nick = self._nick_from_status(st)
+                ts = now_ts()  # KST 고정
+                self.sh.upsert_user(acct, nick, ts)
+                return getattr(self, self.HANDLERS[type(cmd)])(st, acct, nick, cmd)
+            except Exception as e:
+                logging.exception("processing error")
+                self.bot.reply(st, f"처리 중 오류: {type(e).__name__}: {e}")
+
+    def _do_buy(self, st: dict, acct: str, nick: str, cmd: Buy):
+        items = cmd.items  # [("아이템명",수량), ...]
+
+        if not items:
+            return self.bot.reply(st, "구매하려는 항목이 비어 있습니다.")
+
+        mp = self.svc.shop_map()
+        unknown = [name for name, _ in items if name not in mp]
+
+        if unknown:
+            # 오류 2: 물품 미존재
+            return self.bot.reply(
+                st,
+                "해당 물품은 상점에 존재하지 않습니다. "
+                "오타가 없는지 점검 부탁드리며, "
+                "오기재 · 미등록 등으로 판단될 시 운영 계정(@MARCH)으로 문의해 주십시오.\n\n"
+                f"대상 물품 ― {', '.join(unknown)}"
+            )
+
+        # 일일 한도(아이템별) & 총액 계산
+        today = today_str()
+        total = 0
+
+        for name, qty in items:
+            it = mp[name]
+            if it.limit and it.limit > 0:
+                if not self.svc.check_daily_limit(acct, name, it.limit, today, extra=qty):
                     return self.bot.reply(
                         st,
-                        "해당 물품은 상점에 존재하지 않습니다. "
-                        "오타가 없는지 점검 부탁드리며, "
-                        "오기재 · 미등록 등으로 판단될 시 운영 계정(@MARCH)으로 문의해 주십시오.\n\n"
-                        f"대상 물품 ― {', '.join(unknown)}"
+                        f"'{name}'은(는) 하루 {it.limit}회/{it.limit}개까지 구매 가능합니다."
                     )
+            total += it.buy * qty
+
+        bal = self.svc.balance(acct)
+        if bal < total:
+            # 오류 1: 화폐 부족
+            return self.bot.reply(
+                st,
+                f"주머니를 털어 보아도 {Config.CURRENCY} {total}개가 보이지 않는다. 다시 확인해 보자.\n\n"
+                f"현재 보유 수량 ― {bal}개"
+            )
+
+        # 결제 + 지급 + 구매기록을 한 번에 커밋
+        ts = now_ts()
+        with self.svc.txn() as tx:
+            tx.add_bal(acct, -total)
+            for name, qty in items:
+                tx.add_item(acct, name, qty)
+                tx.record_purchase(acct, nick, name, qty, ts)
+
+        # --- 연출 메시지 ---
+        if len(items) == 1:
+            name, qty = items[0]
+            script = mp[name].desc or ""
+            msg = (
+                f"빈 통에 {Config.CURRENCY}을 넣자 {name} 이/가 나타났다.\n\n"
+                f"― {name}x{qty}\n"
+            )
+            if script:
+                msg += f"{script}\n\n"
+            msg += (
+                f"구매 금액 ― {total} {Config.CURRENCY}\n"
+                f"잔액 ― {bal - total} {Config.CURRENCY}"
+            )
+        else:
+            lines = [f"― {n}x{q}" for n, q in items]
+            msg = (
+                    f"빈 통에 {Config.CURRENCY}을 넣자 여러 아이템이 나타났다.\n\n"
+                    + "\n".join(lines)
+                    + "\n\n"
+                      f"구매 금액 ― {total} {Config.CURRENCY}\n"
+                      f"잔액 ― {bal - total} {Config.CURRENCY}"
+            )
+
+        return self.bot.reply(st, msg)
+
+    def _do_use(self, st: dict, acct: str, nick: str, cmd: Use):
+        item = cmd.item
+        mp = self.svc.shop_map()
+        meta = mp.get(item)
+
+        if meta:
+            typ, eff = meta.typ, meta.eff
+        else:
+            typ, eff = "NORMAL", ""
 
-                # 일일 한도(아이템별) & 총액 계산
-                today = today_str()
-                total = 0
-
-                for name, qty in items:
-                    buy_price, sell_price, desc, typ, eff, limit = mp[name]
-                    if limit and limit > 0:
-                        if not self.svc.check_daily_limit(acct, name, limit, today, extra=qty):
-                            return self.bot.reply(
-                                st,
-                                f"'{name}'은(는) 하루 {limit}회/{limit}개까지 구매 가능합니다."
-                            )
-                    total += buy_price * qty
-
-                bal = self.svc.balance(acct)
-                if bal < total:
-                    # 오류 1: 화폐 부족
-                    return self.bot.reply(
-                        st,
-                        f"주머니를 털어 보아도 {Config.CURRENCY} {total}개가 보이지 않는다. 다시 확인해 보자.\n\n"
-                        f"현재 보유 수량 ― {bal}개"
-                    )
+        try:
+            self.svc.remove_item(acct, item, 1)
+        except ValueError:
+            return self.bot.reply(st, f"{nick}이 보유중인 아이템 수량이 부족합니다.")
 
-                # 결제 1회
-                self.svc.add_bal(acct, -total)
-
-                # 지급 + 구매기록
-                ts = now_ts()
-                for name, qty in items:
-                    self.svc.add_item(acct, name, qty)
-                    self.svc.record_purchase(acct, nick, name, qty, ts)
-
-                # --- 연출 메시지 ---
-                if len(items) == 1:
-                    name, qty = items[0]
-                    buy_price, sell_price, desc, typ, eff, limit = mp[name]
-                    script = desc or ""
-                    msg = (
-                        f"빈 통에 {Config.CURRENCY}을 넣자 {name} 이/가 나타났다.\n\n"
-                        f"― {name}x{qty}\n"
-                    )
-                    if script:
-                        msg += f"{script}\n\n"
-                    msg += (
-                        f"구매 금액 ― {total} {Config.CURRENCY}\n"
-                        f"잔액 ― {bal - total} {Config.CURRENCY}"
-                    )
-                else:
-                    lines = [f"― {n}x{q}" for n, q in items]
-                    msg = (
-                            f"빈 통에 {Config.CURRENCY}을 넣자 여러 아이템이 나타났다.\n\n"
-                            + "\n".join(lines)
-                            + "\n\n"
-                              f"구매 금액 ― {total} {Config.CURRENCY}\n"
-                              f"잔액 ― {bal - total} {Config.CURRENCY}"
-                    )
+        if typ == "HEAL":
+            try:
+                heal = int(eff) if eff else 0
+            except Exception:
+                heal = 0
 
-                return self.bot.reply(st, msg)
+            new_hp = self.svc.add_hp(acct, heal)
+
+            return self.bot.reply(st,
+                                  f"{nick}, {item} 사용 → {Config.HP_NAME} +{heal} (현재 {new_hp}/{Config.HP_MAX})")
 
-            if cmd == "use":
-                item = p["item"]
-                mp = self.svc.shop_map()
-                meta = mp.get(item)
+        elif typ == "GACHA":
+            table = eff or item
+            g_item, g_qty, g_script = self.svc.gacha_roll(table)
 
-                if meta:
-                    buy_price, sell_price, desc, typ, eff, limit = meta
+            if g_item:
+                # 아이템 or 화폐 획득
+                if g_item == Config.CURRENCY:
+                    self.svc.add_bal(acct, g_qty)
                 else:
-                    typ, eff = "NORMAL", ""
-
-                try:
-                    self.svc.remove_item(acct, item, 1)
-                except ValueError:
-                    return self.bot.reply(st, f"{nick}이 보유중인 아이템 수량이 부족합니다.")
-
-                if typ == "HEAL":
-                    try:
-                        heal = int(eff) if eff else 0
-                    except Exception:
-                        heal = 0
-
-                    new_hp = self.svc.add_hp(acct, heal)
-
-                    return self.bot.reply(st,
-                                          f"{nick}, {item} 사용 → {Config.HP_NAME} +{heal} (현재 {new_hp}/{Config.HP_MAX})")
-
-                elif typ == "GACHA":
-                    table = eff or item
-                    g_item, g_qty, g_script = self.svc.gacha_roll(table)
-
-                    if g_item:
-                        # 아이템 or 화폐 획득
-                        if g_item == Config.CURRENCY:
-                            self.svc.add_bal(acct, g_qty)
-                        else:
-                            self.svc.add_item(acct, g_item, g_qty)
-                        base = f"두근두근, {item} 을/를 사용해 보자⋯.\n\n"
-                        if g_script:
-                            base += f"{g_script}\n"
-                        if g_item == Config.CURRENCY:
-                            base += f"획득 ― {Config.CURRENCY} {g_qty}개"
-                        else:
-                            base += f"획득 ― {g_item}x{g_qty}"
-                        return self.bot.reply(st, base)
-                    else:
-                        # 아이템은 없지만 스크립트만 있을 수도 있음
-                        msg = "두근두근, {0} 을/를 사용해 보자⋯.\n\n".format(item)
-                        if g_script:
-                            msg += g_script
-                        else:
-                            msg += "⋯아무 일도 일어나지 않았다."
-                        return self.bot.reply(st, msg)
+                    self.svc.add_item(acct, g_item, g_qty)
+                base = f"두근두근, {item} 을/를 사용해 보자⋯.\n\n"
+                if g_script:
+                    base += f"{g_script}\n"
+                if g_item == Config.CURRENCY:
+                    base += f"획득 ― {Config.CURRENCY} {g_qty}개"
                 else:
-                    return self.bot.reply(st, f"{nick}님, {item} 1개 사용")
-
-            if cmd == "sell":  # 판매
-                items = p["items"]
-
-                if not items:
-                    return self.bot.reply(st, "판매하려는 항목이 비어 있습니다.")
-
-                mp = self.svc.shop_map()
-                unknown = [name for name, _ in items if name not in mp]
-
-                if unknown:
-                    # 오류 2: 물품 미존재
-                    return self.bot.reply(
-                        st,
-                        "해당 물품은 상점에 존재하지 않습니다. "
-                        "오타가 없는지 점검 부탁드리며, "
-                        "오기재 · 미등록 등으로 판단될 시 운영 계정(@MARCH)으로 문의해 주십시오.\n\n"
-                        f"대상 물품 ― {', '.join(unknown)}"
-                    )
-
-                # 보유량 사전검증
-                lack = []
-                user_col = self.sh.ensure_user(acct)
-                for name, qty in items:
-                    row = self.sh.row_of(name)
-                    owned = self.sh.read_int(row, user_col)
-                    if owned < qty:
-                        lack.append(f"{name} x{qty}(보유 {owned})")
-
-                if lack:
-                    # 오류 1: 아이템 부족
-                    return self.bot.reply(
-                        st,
-                        "주머니를 털어 보아도 필요한 아이템이 보이지 않는다. 다시 확인해 보자.\n\n"
-                        f"현재 보유 수량 ― {', '.join(lack)}"
-                    )
-
-                # 판매 금액 계산 (판매가 사용)
-                revenue = 0
-                for name, qty in items:
-                    buy_price, sell_price, *_ = mp[name]
-                    revenue += sell_price * qty
-
-                bal_before = self.svc.balance(acct)
-
-                # 회수 → 일괄 입금
-                for name, qty in items:
-                    self.svc.remove_item(acct, name, qty)
-                self.svc.add_bal(acct, revenue)
-
-                bal_after = bal_before + revenue
-
-                if len(items) == 1:
-                    name, qty = items[0]
-                    msg = (
-                        f"빈 통에 {name} 을/를 넣자 {Config.CURRENCY}이 나타났다.\n\n"
-                        f"― {name}x{qty}\n\n"
-                        f"판매 금액 ― {revenue} {Config.CURRENCY}\n"
-                        f"잔액 ― {bal_after} {Config.CURRENCY}"
-                    )
+                    base += f"획득 ― {g_item}x{g_qty}"
+                return self.bot.reply(st, base)
+            else:
+                # 아이템은 없지만 스크립트만 있을 수도 있음
+                msg = "두근두근, {0} 을/를 사용해 보자⋯.\n\n".format(item)
+                if g_script:
+                    msg += g_script
                 else:
-                    lines = [f"― {n}x{q}" for n, q in items]
-                    msg = (
-                            f"빈 통에 여러 아이템을 넣자 {Config.CURRENCY}이 나타났다.\n\n"
-                            + "\n".join(lines)
-                            + "\n\n"
-                              f"판매 금액 ― {revenue} {Config.CURRENCY}\n"
-                              f"잔액 ― {bal_after} {Config.CURRENCY}"
-                    )
-
+                    msg += "⋯아무 일도 일어나지 않았다."
                 return self.bot.reply(st, msg)
-
-            if cmd == "give":
-                target = p["target"].strip()
-                thing = p["thing"].strip()
-                qty = p.get("qty", 1)
-
-                if qty <= 0:
-                    return self.bot.reply(st, "양도 수량은 1 이상이어야 합니다.")
-
-                if not self.sh.user_exists(target): #대상 검증
-                    return self.bot.reply(
-                        st,
-                        "양도 대상이 유저 목록에 존재하지 않습니다. 아이디를 다시 확인해 주세요.\n\n"
-                        f"양도 대상 ― @{target}"
-                    )
-
-                #target 유효성(아이디 포맷 등) 검증은 이미 따로 했다면 그대로 유지
-
-                if thing == Config.CURRENCY:
-                    # 화폐 양도
-                    try:
-                        self.svc.transfer_bal(acct, target, qty)
-                    except ValueError:
-                        return self.bot.reply(
-                            st,
-                            f"주머니를 털어 보아도 {Config.CURRENCY} {qty}개가 보이지 않는다. 다시 확인해 보자.\n\n"
-                            f"현재 보유 수량 ― {self.svc.balance(acct)}개"
-                        )
-
-                    msg = (
-                        f"{Config.CURRENCY} {qty}개 양도가 완료되었다.\n\n"
-                        f"양도 대상 ― @{target}"
-                    )
-                    return self.bot.reply(st, msg)
-
-                else:
-                    # 아이템 양도
-                    try:
-                        self.svc.remove_item(acct, thing, qty)
-                    except ValueError:
-                        return self.bot.reply(
-                            st,
-                            f"주머니를 털어 보아도 {thing} {qty}개가 보이지 않는다. 다시 확인해 보자.\n\n"
-                            "현재 보유 수량은 인벤토리 시트를 확인해 주세요."
-                        )
-
-                    self.svc.add_item(target, thing, qty)
-                    msg = (
-                        f"{thing} {qty}개 양도가 완료되었다.\n\n"
-                        f"양도 대상 ― @{target}"
-                    )
-                    return self.bot.reply(st, msg)
-
-            if cmd == "craft":
-                ings = [x.strip() for x in p["ings"]]
-                match = self.sh.find_recipe(ings)
-
-                # 재료 필요 수량 집계
-                need = Counter(ings)
-                user_col = self.sh.ensure_user(acct)
-
-                # 보유량 검증
-                lack = []
-                for name, q in need.items():
-                    row = self.sh.row_of(name)
-                    owned = self.sh.read_int(row, user_col)
-                    if owned < q:
-                        lack.append(f"{name} x{owned}")
-
-                if lack:
-                    # 오류 1: 재료 부족
-                    return self.bot.reply(
-                        st,
-                        "주머니를 털어 보아도 필요한 재료가 보이지 않는다. 다시 확인해 보자.\n\n"
-                        f"현재 보유 수량 ― {', '.join(lack)}"
-                    )
-
-                # 재료는 성공/실패에 관계없이 소모
-                for name, q in need.items():
-                    self.svc.remove_item(acct, name, q)
-
-                if not match:
-                    # 제작 실패
-                    msg = (
-                        "재료를 한데 넣고 섞어보자. 무엇이 나올까?\n\n"
-                        "⋯아무도 보지 않을 때 몰래 버리자.\n"
-                        "제작 실패 ― 사용 재료 소모"
-                    )
-                    return self.bot.reply(st, msg)
-
-                out_item, out_qty = match
-
-                # 결과 지급
-                self.svc.add_item(acct, out_item, out_qty)
-
-                # 공개 레시피 기록
-                key = Sheets.norm_key(ings)
-                self.sh.public_recipe_append(out_item, out_qty, key, acct, nick, today_str())
-
-                msg = (
-                    "재료를 한데 넣고 섞어보자. 무엇이 나올까?\n\n"
-                    f"{out_item} 이/가 완성되었다!\n"
-                    f"제작 성공 ― {out_item}x{out_qty}"
+        else:
+            return self.bot.reply(st, f"{nick}님, {item} 1개 사용")
+
+    def _do_sell(self, st: dict, acct: str, nick: str, cmd: Sell):
+        items = cmd.items
+
+        if not items:
+            return self.bot.reply(st, "판매하려는 항목이 비어 있습니다.")
+
+        mp = self.svc.shop_map()
+        unknown = [name for name, _ in items if name not in mp]
+
+        if unknown:
+            # 오류 2: 물품 미존재
+            return self.bot.reply(
+                st,
+                "해당 물품은 상점에 존재하지 않습니다. "
+                "오타가 없는지 점검 부탁드리며, "
+                "오기재 · 미등록 등으로 판단될 시 운영 계정(@MARCH)으로 문의해 주십시오.\n\n"
+                f"대상 물품 ― {', '.join(unknown)}"
+            )
+
+        # 보유량 사전검증
+        lack = []
+        user_col = self.sh.ensure_user(acct)
+        for name, qty in items:
+            row = self.sh.row_of(name, create=False)
+            owned = self.sh.read_int(row, user_col)
+            if owned < qty:
+                lack.append(f"{name} x{qty}(보유 {owned})")
+
+        if lack:
+            # 오류 1: 아이템 부족
+            return self.bot.reply(
+                st,
+                "주머니를 털어 보아도 필요한 아이템이 보이지 않는다. 다시 확인해 보자.\n\n"
+                f"현재 보유 수량 ― {', '.join(lack)}"
+            )
+
+        # 판매 금액 계산 (판매가 사용)
+        revenue = 0
+        for name, qty in items:
+            revenue += mp[name].sell * qty
+
+        bal_before = self.svc.balance(acct)
+
+        # 회수 → 일괄 입금 (한 번에 커밋)
+        with self.svc.txn() as tx:
+            for name, qty in items:
+                tx.remove_item(acct, name, qty)
+            tx.add_bal(acct, revenue)
+
+        bal_after = bal_before + revenue
+
+        if len(items) == 1:
+            name, qty = items[0]
+            msg = (
+                f"빈 통에 {name} 을/를 넣자 {Config.CURRENCY}이 나타났다.\n\n"
+                f"― {name}x{qty}\n\n"
+                f"판매 금액 ― {revenue} {Config.CURRENCY}\n"
+                f"잔액 ― {bal_after} {Config.CURRENCY}"
+            )
+        else:
+            lines = [f"― {n}x{q}" for n, q in items]
+            msg = (
+                    f"빈 통에 여러 아이템을 넣자 {Config.CURRENCY}이 나타났다.\n\n"
+                    + "\n".join(lines)
+                    + "\n\n"
+                      f"판매 금액 ― {revenue} {Config.CURRENCY}\n"
+                      f"잔액 ― {bal_after} {Config.CURRENCY}"
+            )
+
+        return self.bot.reply(st, msg)
+
+    def _do_give(self, st: dict, acct: str, nick: str, cmd: Give):
+        target = cmd.target
+        thing = cmd.thing
+        qty = cmd.qty
+
+        if qty <= 0:
+            return self.bot.reply(st, "양도 수량은 1 이상이어야 합니다.")
+
+        if not self.sh.user_exists(target): #대상 검증
+            return self.bot.reply(
+                st,
+                "양도 대상이 유저 목록에 존재하지 않습니다. 아이디를 다시 확인해 주세요.\n\n"
+                f"양도 대상 ― @{target}"
+            )
+
+        #target 유효성(아이디 포맷 등) 검증은 이미 따로 했다면 그대로 유지
+
+        if thing == Config.CURRENCY:
+            # 화폐 양도
+            try:
+                self.svc.transfer_bal(acct, target, qty)
+            except ValueError:
+                return self.bot.reply(
+                    st,
+                    f"주머니를 털어 보아도 {Config.CURRENCY} {qty}개가 보이지 않는다. 다시 확인해 보자.\n\n"
+                    f"현재 보유 수량 ― {self.svc.balance(acct)}개"
                 )
-                return self.bot.reply(st, msg)
-
-            if cmd == "job":
-                today = today_str()
 
-                if self.sh.job_done_today(acct, today):
-                    return self.bot.reply(st, f"{nick}의 아르바이트는 오늘 이미 진행했습니다.")
-
-                reward = random.randint(1, 10)
-                self.svc.add_bal(acct, reward)
-                self.sh.job_append(acct, nick, today, reward)
-
-                msg = (
-                    "노동은 고되나, 본디 남의 주머니에서 돈을 꺼내 가는 건 어려운 일이다.\n\n"
-                    f"보상으로 {reward} {Config.CURRENCY}을 받았다!"
+            msg = (
+                f"{Config.CURRENCY} {qty}개 양도가 완료되었다.\n\n"
+                f"양도 대상 ― @{target}"
+            )
+            return self.bot.reply(st, msg)
+
+        else:
+            # 아이템 양도 (회수·지급을 한 번에 커밋)
+            try:
+                with self.svc.txn() as tx:
+                    tx.remove_item(acct, thing, qty)
+                    tx.add_item(target, thing, qty)
+            except ValueError:
+                return self.bot.reply(
+                    st,
+                    f"주머니를 털어 보아도 {thing} {qty}개가 보이지 않는다. 다시 확인해 보자.\n\n"
+                    "현재 보유 수량은 인벤토리 시트를 확인해 주세요."
                 )
-                return self.bot.reply(st, msg)
 
+            msg = (
+                f"{thing} {qty}개 양도가 완료되었다.\n\n"
+                f"양도 대상 ― @{target}"
+            )
+            return self.bot.reply(st, msg)
+
+    def _do_craft(self, st: dict, acct: str, nick: str, cmd: Craft):
+        ings = [x.strip() for x in cmd.ings]
+        match = self.sh.find_recipe(ings)
+
+        # 재료 필요 수량 집계
+        need = Counter(ings)
+        user_col = self.sh.ensure_user(acct)
+
+        # 보유량 검증
+        lack = []
+        for name, q in need.items():
+            row = self.sh.row_of(name, create=False)
+            owned = self.sh.read_int(row, user_col)
+            if owned < q:
+                lack.append(f"{name} x{owned}")
+
+        if lack:
+            # 오류 1: 재료 부족
+            return self.bot.reply(
+                st,
+                "주머니를 털어 보아도 필요한 재료가 보이지 않는다. 다시 확인해 보자.\n\n"
+                f"현재 보유 수량 ― {', '.join(lack)}"
+            )
+
+        # 재료는 성공/실패에 관계없이 소모, 결과 지급·공개 레시피 기록과 함께 한 번에 커밋
+        with self.svc.txn() as tx:
+            for name, q in need.items():
+                tx.remove_item(acct, name, q)
+            if match:
+                out_item, out_qty = match
+                tx.add_item(acct, out_item, out_qty)
+                key = Sheets.norm_key(ings)
+                tx.record_public_recipe(out_item, out_qty, key, acct, nick, today_str())
+
+        if not match:
+            # 제작 실패
+            msg = (
+                "재료를 한데 넣고 섞어보자. 무엇이 나올까?\n\n"
+                "⋯아무도 보지 않을 때 몰래 버리자.\n"
+                "제작 실패 ― 사용 재료 소모"
+            )
+            return self.bot.reply(st, msg)
+
+        msg = (
+            "재료를 한데 넣고 섞어보자. 무엇이 나올까?\n\n"
+            f"{out_item} 이/가 완성되었다!\n"
+            f"제작 성공 ― {out_item}x{out_qty}"
+        )
+        return self.bot.reply(st, msg)
+
+    def _do_job(self, st: dict, acct: str, nick: str, cmd: Job):
+        today = today_str()
+
+        if not self.sh.job_claim(acct, today):
+            return self.bot.reply(st, f"{nick}의 아르바이트는 오늘 이미 진행했습니다.")
+
+        reward = random.randint(1, 10)
+        self.svc.add_bal(acct, reward)
+        self.sh.job_append(acct, nick, today, reward)
+
+        msg = (
+            "노동은 고되나, 본디 남의 주머니에서 돈을 꺼내 가는 건 어려운 일이다.\n\n"
+            f"보상으로 {reward} {Config.CURRENCY}을 받았다!"
+        )
+        return self.bot.reply(st, msg)
+
+    def _do_status(self, st: dict, acct: str, nick: str, cmd: Status):
+        bal = self.svc.balance(acct)
+        hp = self.svc.hp(acct)
+        return self.bot.reply(st,f"{nick}님의 상태 — {Config.CURRENCY}: {bal}, {Config.HP_NAME}: {hp}/{Config.HP_MAX}")
 
-        except Exception as e:
-            logging.exception("processing error")
-            self.bot.reply(st, f"처리 중 오류: {type(e).__name__}: {e}")
 
 class Listener(StreamListener):
     def __init__(self, disp: 'Dispatch'):
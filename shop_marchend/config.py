@@ -23,11 +23,59 @@ class Config:
 
     # ===== 동작 옵션 =====
     REPLY_VIS       = "public"   # public | unlisted | private | direct
-    WORKERS         = 8            # 병렬 처리 스레드 수
+    WORKERS         = 8            # 병렬 처리 레인(스레드) 수, 같은 acct는 한 레인에서 순서대로
     SHOP_CACHE_TTL  = 600          # 상점 캐시 TTL(초)
+    RECIPE_CACHE_TTL = 600         # 레시피/공개레시피 인덱스 TTL(초)
+    GACHA_CACHE_TTL = 600          # 가챠 테이블/샘플러 TTL(초)
+    USER_FLUSH_SEC  = 5            # 유저목록(최근활동/닉네임/신규) 일괄 전송 주기(초)
+    READ_COALESCE_SEC = 0.0        # 같은 시트 get_all_records 결과 재사용 창(초), 0이면 진행 중인 읽기만 공유
+    INV_GROW_CHUNK  = 50           # 가방 시트 행/열이 모자랄 때 한 번에 늘릴 칸 수
+    # 가방 시트 재적재 주기(초). 운영자가 시트에서 직접 고친 값을 메모리에 반영한다.
+    # 0이면 시작 시 1회만 읽으므로, 그 뒤 운영자가 고친 셀은 봇이 같은 셀을 쓸 때 메모리 값으로 덮인다(수기 지급 유실)
+    INV_RELOAD_SEC  = 60
+
+    # 스트림 재접속 (지수 백오프 + 지터)
+    STREAM_BACKOFF_BASE = 2        # 첫 재접속 대기(초)
+    STREAM_BACKOFF_MAX  = 120      # 최대 대기(초)
+    STREAM_STABLE_SEC   = 60       # 이만큼 버틴 연결이 끊기면 대기 시간 초기화
+    STREAM_CONNECT_SEC  = 30       # 연결이 이 안에 열리지 않으면 핸들을 닫고 백오프 뒤 다시
+
+    # 저장소: sheets = 구글 시트가 기본 저장소 / sqlite = 로컬 SQLite가 기본, 시트는 뒤에서 미러링
+    STORE           = "sheets"
+    SQLITE_PATH     = "shop.db"
+    MIRROR_PULL_SEC = 300          # sqlite 모드에서 시트의 운영자 수정분을 가져오는 주기(초), 0이면 끔
+    JOURNAL_FILE    = "write_journal.log"   # sheets 모드 쓰기 저널(큐 작업 선기록), 빈 문자열이면 끔
+
+    # 시트 API 한도 (Google Sheets 기본: 사용자당 분당 읽기 60회 / 쓰기 60회)
+    SHEETS_READ_PER_MIN  = 60      # 분당 읽기 요청 수, 0이면 한도 없음
+    SHEETS_WRITE_PER_MIN = 60      # 분당 쓰기 요청 수, 0이면 한도 없음
+    SHEETS_RETRY         = 5       # 429/5xx일 때 같은 요청 재시도 횟수
+    SHEETS_BACKOFF_BASE  = 1.0     # 첫 백오프(초), 실패할 때마다 두 배 (지터 포함)
+    SHEETS_BACKOFF_MAX   = 64      # 최대 백오프(초)
+    SHEETS_BATCH_MAX     = 200     # 쓰기 배치 하나에 묶을 작업 수
+    SHEETS_BATCH_MAX_BUSY = 2000   # 한도에 밀릴 때 배치 하나에 묶을 작업 수
+
+    # 처리한 멘션 기록 (같은 멘션 두 번 처리 방지)
+    SEEN_FILE       = "seen_status.log"   # 빈 문자열이면 끔
+    SEEN_MAX        = 50000        # 기억할 최근 status id 수
+
+    # 계측 (명령별 API 호출 수/지연)
+    METRICS_PORT    = 0            # 127.0.0.1:포트/metrics 로 내보내기, 0이면 끔
+    METRICS_LOG_SEC = 600          # 요약을 로그로 남기는 주기(초), 0이면 끔
+
+    # 추적 (멘션 → 답글 구간별 시간)
+    TRACE_FILE      = "slow_traces.jsonl"   # 느린 추적을 남길 파일, 빈 문자열이면 추적 끔
+    TRACE_SLOW_SEC  = 60           # 첫 답글까지 이보다 오래 걸리면 기록
+    TRACE_SAMPLE    = 0.0          # 느리지 않아도 이 확률로 기록(0~1)
+    TRACE_PROFILE   = False        # 명령 처리를 cProfile로 떠서 느린 것만 .prof로 저장
 
     # 답변 텀
-    REPLY_INTERVAL_PER_USER = 15
+    REPLY_INTERVAL_PER_USER = 15   # 같은 유저에게 보내는 답변 사이 최소 간격(초)
+    SENDER_WORKERS  = 4            # 답변 전송 워커 수
+    REPLY_COALESCE  = False        # 같은 유저에게 대기 중인 답변을 한 게시글(스레드)로 합치기
+    MAX_STATUS_CHARS = 500         # 게시글 글자 수 한도(인스턴스 설정을 못 읽을 때)
+    RATE_LIMIT      = 300          # 인스턴스 API 한도(회) — 응답 헤더 값으로 자동 보정
+    RATE_WINDOW     = 300          # 한도 창(초)
 
     # 통화/체력
     CURRENCY        = "갈레온"       # 인벤토리의 통화 행 이름
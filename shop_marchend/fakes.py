@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""자격 증명 없이 돌리는 메모리 가짜 gspread 문서/워크시트와 Mastodon 클라이언트.
+Sheets(ss=FakeSpreadsheet()), Bot(api=FakeMastodon())로 끼워 넣어 벤치마크·재현에 쓴다.
+부른 API는 이름별로 calls(Counter)에 세고, Faults를 걸면 호출마다 지연/429/실패를 섞는다."""
+import itertools, random, threading, time
+from collections import Counter
+from typing import Dict, List, Optional
+from gspread.utils import a1_to_rowcol
+from gspread.exceptions import WorksheetNotFound
+from mastodon import MastodonRatelimitError
+
+class FakeAPIError(Exception):
+    """gspread.exceptions.APIError 흉내(응답 객체 없이 code만)."""
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+
+class Faults:
+    """가짜 백엔드 호출에 끼워 넣을 지연과 오류.
+    latency(초)에 ±jitter 비율만큼 흔들어 잠들고, rate429/fail 확률로 429 또는 500을 던진다."""
+    def __init__(self, latency: float = 0.0, jitter: float = 0.5, rate429: float = 0.0,
+                 fail: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate429 = rate429
+        self.fail = fail
+        self.injected: Counter = Counter()   # "429"/"fail" -> 횟수
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def hit(self, name: str):
+        with self._lock:
+            u = self._rnd.random()
+            j = self._rnd.uniform(-self.jitter, self.jitter)
+        if self.latency > 0:
+            time.sleep(max(0.0, self.latency * (1 + j)))
+        if u < self.rate429:
+            self.injected["429"] += 1
+            raise FakeAPIError(429, f"{name}: quota exceeded")
+        if u < self.rate429 + self.fail:
+            self.injected["fail"] += 1
+            raise FakeAPIError(500, f"{name}: backend error")
+
+class FakeWorksheet:
+    """gspread.Worksheet 중 이 저장소가 쓰는 메서드만. 값은 시트처럼 문자열로 보관한다."""
+    def __init__(self, title: str, rows: int = 1000, cols: int = 26, calls: Optional[Counter] = None,
+                 faults: Optional[Faults] = None):
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.calls = calls if calls is not None else Counter()
+        self.faults = faults
+        self._rows: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def _call(self, name: str):
+        self.calls[name] += 1
+        if self.faults is not None:
+            self.faults.hit(name)
+
+    def _set(self, r: int, c: int, v):
+        while len(self._rows) < r:
+            self._rows.append([])
+        line = self._rows[r - 1]
+        if len(line) < c:
+            line.extend([""] * (c - len(line)))
+        line[c - 1] = "" if v is None else str(v)
+
+    def _put(self, rng: str, values: List[list]):
+        r0, c0 = a1_to_rowcol(rng.split("!")[-1].split(":")[0])
+        for i, row in enumerate(values):
+            for j, v in enumerate(row):
+                self._set(r0 + i, c0 + j, v)
+
+    def fill(self, rows: List[list]):
+        """API 호출로 세지 않고 내용을 통째로 채운다(준비용)."""
+        with self._lock:
+            self._rows = [["" if v is None else str(v) for v in row] for row in rows]
+
+    # ---- 읽기 ----
+    def get_all_values(self) -> List[List[str]]:
+        self._call("get_all_values")
+        with self._lock:
+            width = max((len(r) for r in self._rows), default=0)
+            return [r + [""] * (width - len(r)) for r in self._rows]
+
+    def get_all_records(self, **kw) -> List[Dict]:
+        self._call("get_all_records")
+        with self._lock:
+            if not self._rows:
+                return []
+            hdr = self._rows[0]
+            out = []
+            for line in self._rows[1:]:
+                rec = {}
+                for i, h in enumerate(hdr):
+                    v = line[i] if i < len(line) else ""
+                    try:
+                        v = int(v)  # gspread처럼 숫자는 숫자로
+                    except ValueError:
+                        pass
+                    rec[h] = v
+                out.append(rec)
+            return out
+
+    # ---- 쓰기 ----
+    def update(self, range_name, values=None, **kw):
+        self._call("update")
+        if isinstance(range_name, list):  # gspread 6의 update(values, range_name) 순서
+            range_name, values = values, range_name
+        with self._lock:
+            self._put(range_name, values)
+
+    def batch_update(self, data: List[Dict], **kw):
+        self._call("batch_update")
+        with self._lock:
+            for d in data:
+                self._put(d["range"], d["values"])
+
+    def append_rows(self, rows: List[list], **kw) -> Dict:
+        self._call("append_rows")
+        with self._lock:
+            start = len(self._rows) + 1
+            for i, row in enumerate(rows):
+                for j, v in enumerate(row):
+                    self._set(start + i, j + 1, v)
+            end = start + len(rows) - 1
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:A{end}"}}
+
+    def append_row(self, row: list, **kw) -> Dict:
+        self._call("append_row")
+        return self.append_rows([row])
+
+    def add_rows(self, n: int):
+        self._call("add_rows")
+        self.row_count += n
+
+    def add_cols(self, n: int):
+        self._call("add_cols")
+        self.col_count += n
+
+
+class FakeSpreadsheet:
+    """gspread.Spreadsheet 흉내. 모든 워크시트가 calls 하나를 같이 쓴다(키: 메서드명)."""
+    def __init__(self, faults: Optional[Faults] = None):
+        self.calls: Counter = Counter()
+        self.sheets: Dict[str, FakeWorksheet] = {}
+        self.faults = faults
+
+    def set_faults(self, faults: Optional[Faults]):
+        """이미 만든 워크시트까지 포함해 지연/오류 설정을 바꾼다(준비는 빠르게, 측정만 느리게)."""
+        self.faults = faults
+        for ws in self.sheets.values():
+            ws.faults = faults
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.calls["worksheet"] += 1
+        try:
+            return self.sheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title)
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> FakeWorksheet:
+        self.calls["add_worksheet"] += 1
+        ws = self.sheets[title] = FakeWorksheet(title, rows, cols, self.calls, self.faults)
+        return ws
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeMastodon:
+    """Mastodon.py 클라이언트 흉내. 게시글은 posted에 쌓이고(_t: 게시 시각, monotonic),
+    알림은 notifs에 넣어 두면 min_id로 돌려준다. Faults의 429는 MastodonRatelimitError로 바꿔 던진다."""
+    def __init__(self, acct: str = "shop", max_chars: int = 500, faults: Optional[Faults] = None,
+                 reset_sec: float = 5.0):
+        self.acct = acct
+        self.max_chars = max_chars
+        self.faults = faults
+        self.reset_sec = reset_sec   # 429 뒤 ratelimit_reset까지 남길 시간
+        self.calls: Counter = Counter()
+        self.posted: List[Dict] = []
+        self.notifs: List[Dict] = []
+        self.ratelimit_limit = 300
+        self.ratelimit_remaining = 300
+        self.ratelimit_reset = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def account_verify_credentials(self) -> Dict:
+        self.calls["account_verify_credentials"] += 1
+        return {"acct": self.acct, "id": "0"}
+
+    def instance(self) -> Dict:
+        self.calls["instance"] += 1
+        return {"configuration": {"statuses": {"max_characters": self.max_chars}}}
+
+    def _hit(self, name: str):
+        if self.ratelimit_reset is not None and time.time() >= self.ratelimit_reset:
+            self.ratelimit_remaining = self.ratelimit_limit  # 창이 넘어가면 예산 복구
+            self.ratelimit_reset = None
+        if self.faults is None:
+            return
+        try:
+            self.faults.hit(name)
+        except FakeAPIError as e:
+            if e.code == 429:
+                self.ratelimit_remaining = 0
+                self.ratelimit_reset = time.time() + self.reset_sec
+                raise MastodonRatelimitError(str(e))
+            raise
+
+    def status_post(self, status: str, in_reply_to_id=None, visibility=None, **kw) -> Dict:
+        self.calls["status_post"] += 1
+        self._hit("status_post")
+        with self._lock:
+            st = {"id": str(next(self._ids)), "content": status, "_t": time.monotonic(),
+                  "in_reply_to_id": in_reply_to_id, "visibility": visibility}
+            self.posted.append(st)
+        return st
+
+    def notifications(self, min_id=None, types=None, limit: int = 40, **kw) -> List[Dict]:
+        self.calls["notifications"] += 1
+        self._hit("notifications")
+        out = [n for n in self.notifs
+               if (min_id is None or int(n["id"]) > int(min_id)) and (not types or n.get("type") in types)]
+        out.sort(key=lambda n: int(n["id"]))
+        return list(reversed(out[:limit]))  # 진짜 API처럼 최신순
+
+    def stream_user(self, listener, run_async: bool = False, **kw):
+        self.calls["stream_user"] += 1
+        if run_async:
+            return _FakeStreamHandle(self._deliver, listener)
+        self._deliver(listener)
+
+    def _deliver(self, listener):
+        for n in list(self.notifs):
+            listener.on_notification(n)
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class _FakeStreamHandle:
+    """Mastodon.py 비동기 스트림 핸들 흉내: connection(연결 뒤 생김) / is_alive / close."""
+    def __init__(self, deliver, listener):
+        self.connection = object()
+        self.closed = False
+        self._thread = threading.Thread(target=deliver, args=(listener,), daemon=True, name="fake-stream")
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def close(self):
+        self.closed = True
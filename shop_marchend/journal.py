@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import json, os, threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+class Journal:
+    """쓰기 큐 작업의 선기록(write-ahead) 파일. sheets 모드에서 LocalStore의 outbox 자리를 맡는다.
+    한 줄에 작업 하나('{"i":id,"q":큐,"job":...}') 또는 반영 완료('{"ack":[id...], "sent":[[id,조각]...]}')를 쓴다.
+    가방 작업에 기록 행이 딸려 있으면(job["logs"]) 셀("data")과 기록 행(번호)을 조각별로 따로 완료 처리하고,
+    조각이 다 나가야 작업이 끝난다.
+    fsync는 묶어서(group commit): 여러 스레드가 동시에 sync를 부르면 한 번의 fsync로 함께 끝난다.
+    남은 작업이 없어지면 파일을 비우고, 재시작하면 반영 안 된 작업을 순서대로 돌려준다."""
+    def __init__(self, path: str, compact_n: int = 10000):
+        self.path = path
+        self.compact_n = max(100, int(compact_n))
+        self._lock = threading.Lock()        # 파일 쓰기/상태
+        self._sync_lock = threading.Lock()   # fsync 한 번에 하나
+        self._live: Dict[int, Tuple[str, dict]] = {}   # 아직 시트에 안 나간 작업
+        self._sent: Dict[int, Set] = {}      # id -> 이미 나간 조각("data" / 기록 행 번호)
+        self._latest: Dict[str, list] = {}   # 가방 셀(A1) -> 파일에 적힌 마지막 값
+        self._next = 1
+        self._lines = 0
+        self._written = 0   # 파일에 쓴 마지막 id
+        self._synced = 0    # fsync까지 끝난 마지막 id
+        self._load()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break  # 죽으면서 반쯤 쓴 마지막 줄
+                if not line.endswith(b"\n"):
+                    break
+                good += len(line)
+                self._lines += 1
+                if "ack" in rec:
+                    for i, p in rec.get("sent", ()):
+                        if i in self._live and self._mark(i, p):
+                            rec["ack"].append(i)
+                    for i in rec["ack"]:
+                        self._live.pop(i, None)
+                        self._sent.pop(i, None)
+                    continue
+                i = int(rec["i"])
+                self._live[i] = (rec["q"], rec["job"])
+                self._note(rec["q"], rec["job"])
+                self._next = max(self._next, i + 1)
+        if good < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)  # 잘린 줄 뒤에 이어 쓰지 않게
+        self._written = self._synced = self._next - 1
+
+    def _note(self, q: str, job: dict):
+        if q == "inv":
+            for d in job["data"]:
+                self._latest[d["range"]] = d["values"]
+
+    def _mark(self, i: int, piece) -> bool:
+        # 조각 하나가 나갔다고 적는다. 그 작업의 조각이 다 나갔으면 True
+        job = self._live[i][1]
+        s = self._sent.setdefault(i, set())
+        s.add(piece)
+        need = set(range(len(job.get("logs") or ())))
+        if job.get("data"):
+            need.add("data")
+        return s >= need
+
+    def _append(self, rec: dict):
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._lines += 1
+
+    # ---- outbox 인터페이스(LocalStore와 같은 모양) ----
+    def put(self, q: str, job: dict, sync: bool = True) -> int:
+        with self._lock:
+            i = self._next
+            self._next += 1
+            self._live[i] = (q, job)
+            self._note(q, job)
+            self._append({"i": i, "q": q, "job": job})
+            self._written = i
+        if sync:
+            self.sync(i)
+        return i
+
+    def sync(self, upto: int):
+        """id가 upto인 기록까지 디스크에 내려갔음을 보장한다."""
+        if upto <= self._synced:
+            return
+        with self._sync_lock:
+            if upto <= self._synced:
+                return  # 기다리는 동안 다른 스레드의 fsync에 함께 실렸다
+            with self._lock:
+                self._fh.flush()
+                done = self._written
+                fd = self._fh.fileno()
+            os.fsync(fd)
+            self._synced = max(self._synced, done)
+
+    def ack(self, ids: Iterable[int], parts: Iterable[Tuple[int, object]] = ()):
+        """ids는 통째로 나간 작업, parts는 (id, 조각) — 딸린 기록 행이 있는 가방 작업의 일부."""
+        ids = [i for i in ids if i is not None]
+        parts = [(i, p) for i, p in parts if i is not None]
+        if not ids and not parts:
+            return
+        with self._lock:
+            parts = [(i, p) for i, p in parts if i in self._live]
+            for i, p in parts:
+                if self._mark(i, p):
+                    ids.append(i)
+            for i in ids:
+                self._live.pop(i, None)
+                self._sent.pop(i, None)
+            if not self._live:
+                # 다 반영됐으면 파일을 비운다(ack 줄은 fsync하지 않는다: 잃어도 한 번 더 보낼 뿐)
+                self._fh.flush()
+                self._fh.truncate(0)
+                self._lines = 0
+                self._latest = {}
+                return
+            rec = {"ack": ids}
+            if parts:
+                rec["sent"] = [[i, p] for i, p in parts if i in self._live]
+            self._append(rec)
+            if self._lines <= self.compact_n:
+                return
+        with self._sync_lock, self._lock:  # fsync 중인 파일을 바꿔치지 않게
+            if self._live and self._lines > self.compact_n:
+                self._compact()
+
+    def _compact(self):
+        # 오래 못 나간 작업이 있어 파일이 계속 자라면 남은 작업만 다시 쓴다.
+        # 가방 셀은 그 뒤에 나간 더 새 값이 있을 수 있으니 마지막 값으로 바꿔 적는다
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i, (q, job) in sorted(self._live.items()):
+                if q == "inv":
+                    job = dict(job, data=[{"range": d["range"], "values": self._latest.get(d["range"], d["values"])}
+                                          for d in job["data"]])
+                f.write(json.dumps({"i": i, "q": q, "job": job}, ensure_ascii=False) + "\n")
+                if i in self._sent:
+                    f.write(json.dumps({"ack": [], "sent": [[i, p] for p in self._sent[i]]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._lines = len(self._live) + len(self._sent)
+        self._synced = self._written
+
+    def pending(self, q: str) -> List[Tuple[int, dict]]:
+        """남은 작업. 일부 조각이 이미 나간 작업은 job["sent"]에 그 조각 목록이 붙는다."""
+        with self._lock:
+            return [(i, dict(job, sent=list(self._sent[i])) if i in self._sent else job)
+                    for i, (jq, job) in sorted(self._live.items()) if jq == q]
+
+    def has_pending(self, q: str) -> bool:
+        """q에 아직 안 나간 작업이 있는지. 가방은 셀 조각만 센다(기록 행만 남은 작업은 시트 값과 무관)."""
+        with self._lock:
+            for i, (jq, job) in self._live.items():
+                if jq != q:
+                    continue
+                if q == "inv" and (not job.get("data") or "data" in self._sent.get(i, ())):
+                    continue
+                return True
+            return False
+
+    def latest_cells(self) -> Dict[str, list]:
+        """남은 가방 작업이 건드린 셀의, 파일에 적힌 가장 새 값(A1 -> values)."""
+        with self._lock:
+            rngs = {d["range"] for jq, job in self._live.values() if jq == "inv" for d in job["data"]}
+            return {rng: self._latest[rng] for rng in rngs}
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import logging, threading, queue, zlib
+from typing import Callable, Iterable, List
+
+class _Gate:
+    """여러 레인에 걸친 작업용 관문. 모든 레인이 도착하면 마지막 레인이 실행하고,
+    나머지 레인은 실행이 끝날 때까지 멈춰 있는다."""
+    def __init__(self, n: int):
+        self.n = n
+        self.arrived = 0
+        self.done = False
+        self.cv = threading.Condition()
+
+    def arrive(self) -> bool:
+        with self.cv:
+            self.arrived += 1
+            return self.arrived == self.n
+
+    def finish(self):
+        with self.cv:
+            self.done = True
+            self.cv.notify_all()
+
+    def wait(self):
+        with self.cv:
+            while not self.done:
+                self.cv.wait()
+
+
+class Lanes:
+    """acct 기준으로 샤딩한 실행기.
+    같은 acct의 작업은 한 레인에서 들어온 순서대로, 다른 acct는 레인끼리 병렬로 실행된다.
+    여러 acct에 걸친 작업(양도 등)은 관련 레인을 모두 멈춘 상태에서 한 번만 실행된다."""
+    def __init__(self, n: int):
+        self.n = max(1, int(n))
+        self._qs: List[queue.Queue] = [queue.Queue() for _ in range(self.n)]
+        self._submit_lock = threading.Lock()
+        for i, q in enumerate(self._qs):
+            threading.Thread(target=self._worker, args=(q,), daemon=True, name=f"lane-{i}").start()
+
+    def lane_of(self, key: str) -> int:
+        # hash()는 프로세스마다 달라지므로 crc32로 고정
+        return zlib.crc32(key.encode("utf-8")) % self.n
+
+    def submit(self, keys: Iterable[str], fn: Callable, *args):
+        idx = sorted({self.lane_of(k) for k in keys if k}) or [0]
+        if len(idx) == 1:
+            self._qs[idx[0]].put((fn, args, None))
+            return
+        gate = _Gate(len(idx))
+        # 다중 레인 작업끼리는 모든 레인에서 같은 순서가 되도록 한 번에 넣는다(교착 방지)
+        with self._submit_lock:
+            for i in idx:
+                self._qs[i].put((fn, args, gate))
+
+    def depth(self) -> int:
+        """아직 시작하지 않은 작업 수(다중 레인 작업은 레인마다 하나씩 센다)."""
+        return sum(q.qsize() for q in self._qs)
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            fn, args, gate = q.get()
+            if gate is not None and not gate.arrive():
+                gate.wait()
+                continue
+            try:
+                fn(*args)
+            except Exception:
+                logging.exception("lane task failed")
+            finally:
+                if gate is not None:
+                    gate.finish()
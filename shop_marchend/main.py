@@ -1,21 +1,71 @@
 # -*- coding: utf-8 -*-
-import time, logging
+import time, logging, random
+from .config import Config
 from .masto import Bot
 from .sheets import Sheets
 from .service import ShopService
 from .commands import Dispatch, Listener
+from .metrics import METRICS
+
+def catch_up(bot: Bot, disp: Dispatch) -> int:
+    """스트림이 끊긴 동안 온 멘션을 오래된 것부터 Dispatch에 다시 넣는다."""
+    n = 0
+    while disp.last_id is not None:
+        # min_id: last_id 바로 다음부터 한 페이지(응답은 최신순이라 뒤집어 처리)
+        page = bot.api.notifications(min_id=disp.last_id, types=["mention"], limit=40)
+        if not page:
+            break
+        for notif in sorted(page, key=lambda x: int(x["id"])):
+            disp.on_notif(notif)
+            n += 1
+        if len(page) < 40:
+            break
+    if n:
+        logging.info(f"caught up {n} missed mention(s)")
+    return n
+
+def wait_connected(handle, timeout: float) -> bool:
+    """스트림 핸들의 연결이 열릴 때까지 기다린다(connection은 연결된 뒤에야 생긴다).
+    핸들은 첫 연결이 될 때까지 제한 없이 스스로 재시도하므로, timeout 안에 안 열리면 닫고 False."""
+    deadline = time.monotonic() + timeout
+    while handle.connection is None:
+        if time.monotonic() >= deadline:
+            logging.warning(f"stream connect timed out after {timeout}s")
+            handle.close()
+            return False
+        time.sleep(0.1)
+    return True
+
+def stream_forever(bot: Bot, disp: Dispatch):
+    logging.info("stream start")
+    delay = Config.STREAM_BACKOFF_BASE
+    while True:
+        started = time.monotonic()
+        try:
+            catch_up(bot, disp)
+            handle = bot.api.stream_user(Listener(disp), run_async=True, reconnect_async=False)
+            # 연결이 열린 뒤 한 번 더 훑는다: 위 catch_up과 연결 사이에 온 멘션 (겹치는 건 SeenStore가 거른다)
+            if wait_connected(handle, Config.STREAM_CONNECT_SEC):
+                catch_up(bot, disp)
+                while handle.is_alive():  # 비재연결 모드라 연결이 끊기면 핸들 스레드가 끝난다
+                    time.sleep(1.0)
+                logging.warning("stream closed")
+        except Exception:
+            logging.exception("stream error")
+        # 한동안 잘 붙어 있었으면 대기 시간을 처음부터
+        if time.monotonic() - started > Config.STREAM_STABLE_SEC:
+            delay = Config.STREAM_BACKOFF_BASE
+        wait = delay / 2 + random.uniform(0, delay / 2)  # 지수 백오프 + 지터
+        logging.info(f"stream reconnect in {wait:.1f}s")
+        time.sleep(wait)
+        delay = min(Config.STREAM_BACKOFF_MAX, delay * 2)
 
 def main():
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    METRICS.serve(Config.METRICS_PORT)
+    METRICS.log_every(Config.METRICS_LOG_SEC)
     bot = Bot()
     sh  = Sheets()
     svc = ShopService(sh)
     disp = Dispatch(bot, svc, sh)
-
-    logging.info("stream start")
-    while True:
-        try:
-            bot.api.stream_user(Listener(disp), run_async=False, reconnect_async=False)
-        except Exception:
-            logging.exception("stream error; retry in 5s")
-            time.sleep(5)
+    stream_forever(bot, disp)
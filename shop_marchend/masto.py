@@ -1,58 +1,199 @@
 # -*- coding: utf-8 -*-
 import logging, time, threading, heapq
-from mastodon import Mastodon
+from typing import Optional, Tuple
+from mastodon import Mastodon, MastodonRatelimitError
 from .config import Config
+from .metrics import METRICS, MASTO_CALLS
+from .tracing import TRACER
+
+class _RateBudget:
+    """인스턴스 전체 게시 예산(토큰 버킷). 응답의 rate-limit 헤더 값으로 계속 보정한다."""
+    def __init__(self, limit: int, window: float):
+        self.cap = float(limit)
+        self.rate = limit / float(window)
+        self.tokens = self.cap
+        self.t = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+                self.t = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(min(max(wait, 0.05), 5.0))
+
+    def sync(self, api, exhausted: bool = False):
+        """Mastodon.py가 마지막 응답에서 읽어 둔 X-RateLimit-* 값을 반영한다."""
+        limit = getattr(api, "ratelimit_limit", None)
+        remaining = getattr(api, "ratelimit_remaining", None)
+        reset = getattr(api, "ratelimit_reset", None)  # epoch 초
+        with self._lock:
+            if limit:
+                self.cap = float(limit)
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+            if exhausted or remaining == 0:
+                left = (reset - time.time()) if reset else 60.0
+                self.blocked_until = time.monotonic() + max(1.0, left)
+                self.tokens = 0.0
+
 
 class Bot:
-    def __init__(self):
-        self.api = Mastodon(
+    def __init__(self, api=None):
+        # api를 넘기면(가짜 클라이언트 등) 그걸 쓴다
+        api = api if api is not None else Mastodon(
             api_base_url=Config.BASE_URL,
             access_token=Config.ACCESS_TOKEN,
-            ratelimit_method="pace",
+            ratelimit_method="throw",  # 대기는 _RateBudget이 맡는다(라이브러리 안에서 잠들지 않게)
         )
+        self.api = METRICS.wrap(api, "mastodon", MASTO_CALLS)
         me = self.api.account_verify_credentials()
         self.me_acct = me["acct"]
         logging.info(f"Bot login @{self.me_acct}")
 
+        # 게시글 최대 글자 수(인스턴스 설정, 못 읽으면 Config 값)
+        self.max_chars = Config.MAX_STATUS_CHARS
+        try:
+            self.max_chars = int(self.api.instance()["configuration"]["statuses"]["max_characters"])
+        except Exception:
+            pass
+
         # ▶ 유저별 페이싱 상태
-        self._last_sent = {}   # acct -> last ready_time (monotonic)
-        self._pq = []          # min-heap of (ready_time, seq, status, text, author)
+        self._last_sent = {}   # acct -> 마지막 전송(또는 예약) 시각 (monotonic)
+        self._pq = []          # min-heap of [ready_time, seq, status, texts, author, cmds, [(trace, 넣은 시각)]]
+        self._pending = {}     # acct -> 아직 안 보낸 힙 항목 (REPLY_COALESCE일 때 합치기용)
         self._cv = threading.Condition()
         self._seq = 0
+        self._budget = _RateBudget(Config.RATE_LIMIT, Config.RATE_WINDOW)
+        METRICS.gauge("reply_heap", lambda: len(self._pq))
 
-        # 전송 워커 시작
-        t = threading.Thread(target=self._sender, daemon=True)
-        t.start()
+        # 전송 워커 풀 시작
+        for i in range(max(1, Config.SENDER_WORKERS)):
+            threading.Thread(target=self._sender, daemon=True, name=f"sender-{i}").start()
 
     def reply(self, status: dict, text: str):
-        """멘션은 유지하고, 유저별 고정 지연 후 전송을 스케줄링한다."""
+        """멘션은 유지하고, 같은 유저의 직전 전송으로부터 간격을 두어 전송을 스케줄링한다.
+        REPLY_COALESCE가 켜져 있으면 아직 대기 중인 같은 유저의 답변에 이어 붙여 한 번에 보낸다."""
         author = status["account"]["acct"]
         now = time.monotonic()
         interval = getattr(Config, "REPLY_INTERVAL_PER_USER", 5)
 
-        ready_time = now + interval  #항상 지금으로부터 interval초 뒤
-
         with self._cv:
+            if Config.REPLY_COALESCE:
+                ent = self._pending.get(author)
+                if ent is not None:
+                    ent[3].append(text)
+                    ent[5].append(METRICS.current())
+                    ent[6].append((TRACER.current(), now))
+                    return
+            # 그 유저에게 최근에 보낸 적이 없으면 바로, 있으면 마지막 전송 + interval
+            ready_time = max(now, self._last_sent.get(author, float("-inf")) + interval)
+            self._last_sent[author] = ready_time
             self._seq += 1
-            heapq.heappush(self._pq, (ready_time, self._seq, status, text, author))
+            ent = [ready_time, self._seq, status, [text], author, [METRICS.current()], [(TRACER.current(), now)]]
+            heapq.heappush(self._pq, ent)
+            if Config.REPLY_COALESCE:
+                self._pending[author] = ent
             self._cv.notify()
 
     def _sender(self):
         while True:
             with self._cv:
-                while not self._pq:
-                    self._cv.wait()
-                ready, seq, status, text, author = heapq.heappop(self._pq)
-                wait = ready - time.monotonic()
-            if wait > 0:
-                time.sleep(wait)
-
-            try:
-                body = f"@{author} {text}"  # 알림용 멘션은 그대로 유지
-                self.api.status_post(
-                    status=body,
-                    in_reply_to_id=status["id"],
-                    visibility=Config.REPLY_VIS,
-                )
-            except Exception:
-                logging.exception("reply send failed")
\ No newline at end of file
+                # 맨 앞 항목의 시각까지 기다리되, 잠든 동안 다른 워커/새 항목을 막지 않는다
+                while True:
+                    if not self._pq:
+                        self._cv.wait()
+                        continue
+                    wait = self._pq[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cv.wait(wait)
+                ready, seq, status, texts, author, cmds, traced = heapq.heappop(self._pq)
+                if self._pending.get(author) is not None and self._pending[author][1] == seq:
+                    del self._pending[author]
+            now = time.monotonic()
+            trs = [tr for tr, _ in traced if tr is not None]
+            for tr, t_enq in traced:
+                if tr is not None:
+                    tr.add("reply_wait", t_enq, now)  # 유저별 간격/예산 대기 포함
+            with METRICS.attributed(cmds), TRACER.activate(trs):
+                left = self._post(status, texts, author)
+            if left is not None:
+                # 한도에 막혀 못 보낸 나머지는 예산이 풀리는 시각에 다시 (추적은 그때 끝낸다)
+                parent, rest = left
+                with self._cv:
+                    ready = max(self._budget.blocked_until, time.monotonic())
+                    self._last_sent[author] = max(self._last_sent.get(author, 0.0), ready)
+                    self._seq += 1
+                    heapq.heappush(self._pq, [ready, self._seq, dict(status, id=parent), rest, author, cmds,
+                                              [(tr, now) for tr, _ in traced]])
+                    self._cv.notify()
+                continue
+            for tr in trs:
+                TRACER.finish(tr)
+
+    def _chunks(self, author: str, texts: list) -> list:
+        """답변들을 글자 수 한도 안에서 최대한 한 게시글로 묶는다. 넘치면 다음 게시글로."""
+        head = f"@{author} "  # 알림용 멘션은 그대로 유지
+        room = max(1, self.max_chars - len(head))
+        out, cur = [], ""
+        for t in texts:
+            while len(t) > room:  # 한 답변이 혼자서도 넘치면 자른다
+                if cur:
+                    out.append(cur)
+                    cur = ""
+                out.append(t[:room])
+                t = t[room:]
+            joined = f"{cur}\n\n{t}" if cur else t
+            if len(joined) > room:
+                out.append(cur)
+                cur = t
+            else:
+                cur = joined
+        if cur:
+            out.append(cur)
+        return [head + c for c in out]
+
+    def _post(self, status: dict, texts: list, author: str) -> Optional[Tuple[str, list]]:
+        """답변을 보낸다. 한도 오류가 거듭되면 (이어 달 부모 id, 못 보낸 본문들)을 돌려준다(다시 예약용)."""
+        # 여러 게시글로 나뉘면 직전 게시글에 이어 달아 스레드로 만든다
+        parent = status["id"]
+        head = f"@{author} "
+        bodies = self._chunks(author, texts)
+        for i, body in enumerate(bodies):
+            posted = None
+            limited = False
+            for _ in range(3):
+                self._budget.acquire()
+                try:
+                    posted = self.api.status_post(
+                        status=body,
+                        in_reply_to_id=parent,
+                        visibility=Config.REPLY_VIS,
+                    )
+                    self._budget.sync(self.api)
+                    break
+                except MastodonRatelimitError:
+                    # 예산이 바닥났으면 리셋 시각까지 모든 워커가 함께 쉰다
+                    self._budget.sync(self.api, exhausted=True)
+                    limited = True
+                except Exception:
+                    logging.exception("reply send failed")
+                    limited = False
+                    break
+            if not posted:
+                if limited:
+                    logging.warning(f"reply to @{author} rate-limited {len(bodies) - i} post(s) left; "
+                                    f"requeued for budget reset")
+                    return parent, [b[len(head):] for b in bodies[i:]]
+                break
+            parent = posted["id"] if isinstance(posted, dict) and posted.get("id") else parent
+        with self._cv:
+            self._last_sent[author] = max(self._last_sent.get(author, 0.0), time.monotonic())
+        return None
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""API 호출 계측. 시트/마스토돈 호출 수와 지연 히스토그램을 명령 종류별로 모은다.
+
+- 명령 처리 스레드는 command(이름)으로 현재 명령을 스레드 로컬에 걸어 둔다.
+- 쓰기 큐/답변 힙처럼 여러 명령을 묶어 보내는 호출은 attributed([이름...])으로 걸고,
+  호출 하나를 그 안의 명령들이 나눠 가진다(예: 구매 3건 + 판매 1건이면 0.75 / 0.25).
+- 큐 깊이 같은 값은 gauge(이름, 함수)로 등록해 두면 내보낼 때 읽는다.
+- serve(port)는 127.0.0.1:port/metrics 에 Prometheus 텍스트 형식으로, log_every(sec)는 로그로 요약을 낸다."""
+import bisect, logging, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .tracing import TRACER
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NONE = "-"   # 어느 명령에도 속하지 않는 호출(주기 작업 등)
+
+# 계측할 메서드(이 밖의 속성은 그대로 통과). stream_user처럼 오래 붙어 있는 호출은 넣지 않는다
+SHEETS_CALLS = frozenset({"cell", "col_values", "row_values", "get_all_values", "get_all_records",
+                          "update", "batch_update", "append_rows", "append_row", "add_rows", "add_cols"})
+MASTO_CALLS = frozenset({"status_post", "notifications", "account_verify_credentials", "instance"})
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.n = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.n += 1
+
+    def quantile(self, q: float) -> float:
+        """버킷 상한으로 어림한 분위수(마지막 버킷이면 inf)."""
+        if not self.n:
+            return 0.0
+        rank, acc = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self.calls: Dict[Tuple[str, str, str], float] = defaultdict(float)   # (api, method, cmd) -> 호출 수
+        self.errors: Dict[Tuple[str, str], int] = defaultdict(int)           # (api, method) -> 실패 수
+        self.latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.commands: Dict[str, Histogram] = defaultdict(Histogram)         # 명령 -> 처리 시간
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    # ---- 명령 귀속 ----
+    def current(self) -> Optional[str]:
+        labels = getattr(self._tls, "labels", None)
+        return labels[0] if labels else None
+
+    @contextmanager
+    def attributed(self, labels: Iterable[Optional[str]]):
+        prev = getattr(self._tls, "labels", None)
+        self._tls.labels = [l or NONE for l in labels] or None
+        try:
+            yield
+        finally:
+            self._tls.labels = prev
+
+    @contextmanager
+    def command(self, name: str):
+        """명령 하나를 처리하는 동안: 이 스레드의 호출을 name에 귀속하고 처리 시간도 잰다."""
+        t0 = time.perf_counter()
+        with self.attributed([name]):
+            try:
+                yield
+            finally:
+                dt = time.perf_counter() - t0
+                with self._lock:
+                    self.commands[name].observe(dt)
+
+    # ---- 호출 기록 ----
+    def observe_call(self, api: str, method: str, dt: float, ok: bool):
+        labels = getattr(self._tls, "labels", None) or [NONE]
+        share = 1.0 / len(labels)
+        with self._lock:
+            for l in labels:
+                self.calls[(api, method, l)] += share
+            self.latency[(api, method)].observe(dt)
+            if not ok:
+                self.errors[(api, method)] += 1
+
+    def wrap(self, target, api: str, methods: Iterable[str]):
+        return _Instrumented(self, target, api, frozenset(methods))
+
+    def gauge(self, name: str, fn: Callable[[], float]):
+        """같은 이름으로 다시 등록하면 새 함수로 바뀐다."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def gauges(self) -> Dict[str, float]:
+        with self._lock:
+            items = list(self._gauges.items())
+        out = {}
+        for name, fn in items:
+            try:
+                out[name] = float(fn())
+            except Exception:
+                pass
+        return out
+
+    # ---- 내보내기 ----
+    def render(self) -> str:
+        """Prometheus 텍스트 형식."""
+        with self._lock:
+            calls = dict(self.calls)
+            errors = dict(self.errors)
+            lat = {k: (list(h.counts), h.sum, h.n) for k, h in self.latency.items()}
+            cmds = {k: (list(h.counts), h.sum, h.n) for k, h in self.commands.items()}
+        out = ["# TYPE shop_api_calls_total counter"]
+        for (api, m, c), v in sorted(calls.items()):
+            out.append(f'shop_api_calls_total{{api="{api}",method="{m}",command="{c}"}} {v:g}')
+        out.append("# TYPE shop_api_errors_total counter")
+        for (api, m), v in sorted(errors.items()):
+            out.append(f'shop_api_errors_total{{api="{api}",method="{m}"}} {v}')
+        out.append("# TYPE shop_api_seconds histogram")
+        for (api, m), h in sorted(lat.items()):
+            out += _hist_lines("shop_api_seconds", f'api="{api}",method="{m}"', *h)
+        out.append("# TYPE shop_command_seconds histogram")
+        for c, h in sorted(cmds.items()):
+            out += _hist_lines("shop_command_seconds", f'command="{c}"', *h)
+        out.append("# TYPE shop_gauge gauge")
+        for name, v in sorted(self.gauges().items()):
+            out.append(f'shop_gauge{{name="{name}"}} {v:g}')
+        return "\n".join(out) + "\n"
+
+    def summary(self) -> str:
+        """로그용 한 덩어리 요약: 명령별 API 호출, 메서드별 p50/p95, 게이지."""
+        with self._lock:
+            by_cmd: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+            for (api, m, c), v in self.calls.items():
+                by_cmd[c][api] += v
+            lat = [(api, m, h.n, h.quantile(0.5), h.quantile(0.95), self.errors.get((api, m), 0))
+                   for (api, m), h in sorted(self.latency.items())]
+            ncmd = {c: h.n for c, h in self.commands.items()}
+        lines = ["metrics summary"]
+        for c, apis in sorted(by_cmd.items(), key=lambda kv: -sum(kv[1].values())):
+            n = ncmd.get(c, 0)
+            per = "  ".join(f"{api} {v:.0f}" + (f" ({v / n:.2f}/cmd)" if n else "") for api, v in sorted(apis.items()))
+            lines.append(f"  {c:<8} x{n:<6} {per}")
+        for api, m, n, p50, p95, err in lat:
+            lines.append(f"  {api}.{m:<16} n={n:<6} p50<={p50:g}s p95<={p95:g}s err={err}")
+        g = self.gauges()
+        if g:
+            lines.append("  " + "  ".join(f"{k}={v:g}" for k, v in sorted(g.items())))
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+        if not port:
+            return None
+        reg = self
+
+        class _H(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = reg.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a):
+                pass
+
+        srv = ThreadingHTTPServer((host, port), _H)
+        threading.Thread(target=srv.serve_forever, daemon=True, name="metrics-http").start()
+        logging.info(f"metrics on http://{host}:{port}/metrics")
+        return srv
+
+    def log_every(self, sec: float):
+        if sec <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(sec)
+                logging.info(self.summary())
+        threading.Thread(target=loop, daemon=True, name="metrics-log").start()
+
+
+def _hist_lines(name: str, labels: str, counts: List[int], total: float, n: int) -> List[str]:
+    out, acc = [], 0
+    for b, c in zip(BUCKETS, counts):
+        acc += c
+        out.append(f'{name}_bucket{{{labels},le="{b:g}"}} {acc}')
+    out.append(f'{name}_bucket{{{labels},le="+Inf"}} {n}')
+    out.append(f"{name}_sum{{{labels}}} {total:.6f}")
+    out.append(f"{name}_count{{{labels}}} {n}")
+    return out
+
+
+class _Instrumented:
+    """워크시트/클라이언트 대리 객체. 지정한 메서드만 시간을 재고, 나머지 속성은 그대로 넘긴다."""
+    def __init__(self, reg: Metrics, target, api: str, methods: frozenset):
+        self.__dict__.update(_reg=reg, _target=target, _api=api, _methods=methods)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if name not in self._methods:
+            return attr
+        reg, api = self._reg, self._api
+
+        def call(*a, **kw):
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                with TRACER.span(f"{api}.{name}"):
+                    res = attr(*a, **kw)
+                ok = True
+                return res
+            finally:
+                reg.observe_call(api, name, time.perf_counter() - t0, ok)
+        return call
+
+    def __setattr__(self, name: str, value):
+        setattr(self._target, name, value)
+
+
+METRICS = Metrics()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""시트 API 한도 스케줄러. Sheets의 모든 API 호출이 여기를 지난다.
+
+- 읽기/쓰기 한도(분당)를 토큰 버킷 두 개로 따로 센다. 기다리는 호출은 우선순위 → 도착 순으로 토큰을 받는다.
+  우선순위는 스레드마다 set_priority로 걸어 둔다(안 걸면 명령 처리 = 가장 먼저).
+- 429/5xx가 오면 그 버킷 전체를 지수 백오프(+지터) 동안 막고 같은 호출을 다시 보낸다.
+  성공하면 백오프 단계가 초기화된다. SHEETS_RETRY번 넘게 실패하면 예외를 그대로 올린다.
+- 쓰기 큐는 wait_ready로 토큰을 기다리는 동안 쌓인 작업을 한 배치로 묶는다(밀릴수록 배치가 커진다)."""
+import heapq, itertools, logging, random, threading, time
+from typing import Optional
+
+from .config import Config
+from .tracing import TRACER
+
+# 우선순위 (작을수록 먼저)
+P_CMD   = 0   # 명령 처리 중 호출: 유저가 답을 기다린다
+P_INV   = 1   # 인벤토리 쓰기 큐
+P_USERS = 2   # 유저목록 일괄 갱신
+P_BG    = 3   # 주기 재적재
+P_LOG   = 4   # 기록 시트 append
+
+READS  = frozenset({"cell", "col_values", "row_values", "get_all_values", "get_all_records", "worksheet"})
+WRITES = frozenset({"update", "batch_update", "append_rows", "append_row", "add_rows", "add_cols", "add_worksheet"})
+
+def error_code(e: BaseException) -> Optional[int]:
+    # gspread APIError(신버전은 .code, 구버전은 .response.status_code) / 가짜 오류 모두
+    code = getattr(e, "code", None)
+    if code is None:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+    try:
+        return int(code) if code is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def retryable(e: BaseException) -> bool:
+    """한도 초과(429)나 서버 오류(5xx)면 True. 기다렸다 같은 요청을 다시 보내면 되는 오류."""
+    code = error_code(e)
+    return code is not None and (code == 429 or 500 <= code < 600)
+
+
+class _Bucket:
+    """분당 한도 토큰 버킷. per_min <= 0이면 한도 없음(백오프만 적용)."""
+    def __init__(self, name: str, per_min: float):
+        self.name = name
+        self.cap = float(per_min) if per_min > 0 else 0.0
+        self.rate = self.cap / 60.0
+        self.tokens = self.cap
+        self.t = time.monotonic()
+        self.blocked_until = 0.0
+        self.fails = 0                 # 연속 429/5xx 횟수(백오프 단계)
+        self._waiters = []             # heap of (우선순위, 순번)
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+
+    def _delay(self, now: float) -> float:
+        # 토큰 하나가 생기고 백오프가 풀릴 때까지 남은 시간 (cv 잡은 채로)
+        wait = self.blocked_until - now
+        if self.cap:
+            self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+            self.t = now
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return max(0.0, wait)
+
+    def take(self, prio: int):
+        with self._cv:
+            me = (prio, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    wait = self._delay(time.monotonic())
+                    head = self._waiters[0] == me
+                    if head and wait <= 0:
+                        heapq.heappop(self._waiters)
+                        if self.cap:
+                            self.tokens -= 1
+                        self._cv.notify_all()
+                        return
+                    # 맨 앞이면 토큰이 찰 때까지, 아니면 앞사람이 가져갈 때까지
+                    self._cv.wait(max(wait, 0.01) if head else 1.0)
+            finally:
+                if me in self._waiters:
+                    self._waiters.remove(me)
+                    heapq.heapify(self._waiters)
+                    self._cv.notify_all()
+
+    def wait_ready(self) -> float:
+        """토큰을 쓰지 않고, 지금 보내면 바로 나갈 수 있을 때까지 기다린다.
+        기다린 시간(초)을 돌려주며, 처음부터 토큰이 있었으면 정확히 0.0."""
+        t0 = time.monotonic()
+        waited = False
+        with self._cv:
+            while True:
+                wait = self._delay(time.monotonic())
+                if wait <= 0:
+                    return time.monotonic() - t0 if waited else 0.0
+                waited = True
+                self._cv.wait(wait)
+
+    def backoff(self) -> float:
+        with self._cv:
+            self.fails += 1
+            d = min(Config.SHEETS_BACKOFF_MAX, Config.SHEETS_BACKOFF_BASE * 2 ** (self.fails - 1))
+            d = random.uniform(d / 2, d)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + d)
+            self.tokens = min(self.tokens, 0.0)   # 한도를 넘겼다는 뜻이니 남은 토큰도 믿지 않는다
+            self._cv.notify_all()
+            return d
+
+    def ok(self):
+        if self.fails:
+            with self._cv:
+                self.fails = 0
+
+
+class Quota:
+    def __init__(self, read_per_min: float, write_per_min: float):
+        self.read = _Bucket("read", read_per_min)
+        self.write = _Bucket("write", write_per_min)
+        self._tls = threading.local()
+
+    # ---- 우선순위 ----
+    def set_priority(self, prio: int):
+        """이 스레드에서 부르는 시트 호출의 우선순위(스레드가 끝날 때까지)."""
+        self._tls.prio = prio
+
+    def priority(self) -> int:
+        return getattr(self._tls, "prio", P_CMD)
+
+    # ---- 호출 ----
+    def bucket(self, kind: str) -> _Bucket:
+        return self.read if kind == "read" else self.write
+
+    def wait_ready(self, kind: str) -> float:
+        return self.bucket(kind).wait_ready()
+
+    def call(self, kind: str, name: str, fn, *a, **kw):
+        b, prio = self.bucket(kind), self.priority()
+        for i in range(Config.SHEETS_RETRY + 1):
+            t0 = time.monotonic()
+            b.take(prio)
+            t1 = time.monotonic()
+            if t1 - t0 > 0.001:
+                TRACER.record("quota_wait", t0, t1, kind=kind, method=name)
+            try:
+                res = fn(*a, **kw)
+            except Exception as e:
+                if not retryable(e):
+                    raise
+                d = b.backoff()
+                if i >= Config.SHEETS_RETRY:
+                    raise
+                logging.warning(f"sheets {name} {error_code(e)}: {kind} backoff {d:.1f}s (retry {i + 1})")
+                continue
+            b.ok()
+            return res
+
+    def wrap(self, target):
+        return _Scheduled(self, target)
+
+
+class _Scheduled:
+    """워크시트/문서 대리 객체. 읽기/쓰기 메서드는 Quota.call로, 나머지 속성은 그대로 넘긴다."""
+    def __init__(self, quota: Quota, target):
+        self.__dict__.update(_quota=quota, _target=target)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        kind = "read" if name in READS else "write" if name in WRITES else None
+        if kind is None:
+            return attr
+        quota = self._quota
+        return lambda *a, **kw: quota.call(kind, name, attr, *a, **kw)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._target, name, value)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""멘션 재생 부하 하네스. 가짜 시트/마스토돈(fakes) 위에서 실제 경로 전체를 돌린다.
+
+    python -m shop_marchend.replay [notifs.jsonl] [--synth 500] [--rate 20] [--sheet-latency 0.3] ...
+
+JSONL 한 줄이 알림 하나(Mastodon notification 모양). 파일이 없으면 --synth개를 만들어 쓴다(--save로 저장).
+알림을 정해진 도착률로 Listener.on_notification에 넣고, Dispatch → Sheets 쓰기 큐 → Bot 전송까지 지나
+첫 답글이 게시될 때까지의 시간을 잰다. 끝나면 p50/p95/p99, 시간별 큐 깊이, API 호출 수를 찍는다."""
+import argparse, json, math, os, random, tempfile, threading, time
+from typing import Dict, List, Optional
+
+from .config import Config
+from .fakes import Faults, FakeMastodon
+from .masto import Bot
+from .commands import Dispatch, Listener, Parser
+from .metrics import METRICS
+from . import bench
+
+# 합성 명령 비율
+MIX = [("buy", 30), ("sell", 15), ("craft", 10), ("gacha", 15), ("job", 10), ("give", 10), ("status", 10)]
+
+def synth(n: int, users: int, seed: int = 7) -> List[Dict]:
+    """users명이 섞어 보내는 멘션 n개(구매/판매/제작/가챠/아르바이트/양도/상태)."""
+    rnd = random.Random(seed)
+    items = [f"아이템{i}" for i in range(bench.N_BAG)]
+    kinds, weights = zip(*MIX)
+    out = []
+    for i in range(n):
+        acct = f"user{rnd.randrange(users)}"
+        kind = rnd.choices(kinds, weights)[0]
+        if kind == "buy":
+            cmd = f"[구매/{rnd.choice(items)}*{rnd.randint(1, 3)}]"
+        elif kind == "sell":
+            cmd = f"[판매/{rnd.choice(items)}]"
+        elif kind == "craft":
+            cmd = f"[제작/{rnd.choice(items)}-{rnd.choice(items)}]"
+        elif kind == "gacha":
+            cmd = f"[사용/{bench.GACHA_ITEM}]"
+        elif kind == "job":
+            cmd = "[아르바이트]"
+        elif kind == "give":
+            thing = Config.CURRENCY if rnd.random() < 0.5 else rnd.choice(items)
+            cmd = f"[양도/user{rnd.randrange(users)}:{thing}:1]"
+        else:
+            cmd = "[상태]"
+        out.append({"id": str(i + 1), "type": "mention", "account": {"acct": acct},
+                    "status": {"id": f"s{i + 1}", "content": f"<p>@shop {cmd}</p>",
+                               "account": {"acct": acct, "display_name": acct.upper()}}})
+    return out
+
+def load(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def pct(xs: List[float], p: float) -> float:
+    if not xs:
+        return float("nan")
+    return xs[min(len(xs) - 1, max(0, math.ceil(p / 100 * len(xs)) - 1))]
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        # 파일들은 임시 폴더로, 튜닝 값은 실행 인자로
+        tmp = tempfile.mkdtemp(prefix="shop-replay-")
+        Config.SEEN_FILE = ""
+        Config.JOURNAL_FILE = os.path.join(tmp, "journal.log") if Config.JOURNAL_FILE else ""
+        Config.SQLITE_PATH = os.path.join(tmp, "shop.db")
+        Config.WORKERS = args.workers
+        Config.SENDER_WORKERS = args.senders
+        Config.REPLY_INTERVAL_PER_USER = args.interval
+        Config.SHEETS_READ_PER_MIN = args.read_quota
+        Config.SHEETS_WRITE_PER_MIN = args.write_quota
+
+        self.ss, self.sh, self.svc = bench.build(args.users, seed=args.seed)
+        # 준비가 끝난 뒤에만 지연/오류를 건다
+        self.sheet_faults = Faults(args.sheet_latency, rate429=args.sheet_429, fail=args.sheet_fail, seed=args.seed)
+        self.post_faults = Faults(args.post_latency, rate429=args.post_429, fail=args.post_fail, seed=args.seed + 1)
+        self.ss.set_faults(self.sheet_faults)
+        self.api = FakeMastodon(faults=self.post_faults)
+        self.bot = Bot(api=self.api)
+        self.disp = Dispatch(self.bot, self.svc, self.sh)
+        self.listener = Listener(self.disp)
+        self.arrived: Dict[str, float] = {}
+        self.samples: List[tuple] = []
+        self._stop = threading.Event()
+
+    def _replied(self) -> Dict[str, float]:
+        # 멘션 id -> 첫 답글 게시 시각 (이어 단 답글은 앞 게시글에 달리므로 빠진다)
+        out: Dict[str, float] = {}
+        for p in list(self.api.posted):
+            sid = p["in_reply_to_id"]
+            if sid in self.arrived and sid not in out:
+                out[sid] = p["_t"]
+        return out
+
+    def _sampler(self, t0: float):
+        while not self._stop.is_set():
+            with self.bot._cv:
+                heap = len(self.bot._pq)
+            self.samples.append((time.monotonic() - t0, self.disp.exec.depth(), self.sh._wq_inv.qsize(),
+                                 self.sh._wq_log.qsize(), heap, len(self._replied())))
+            self._stop.wait(self.args.sample)
+
+    def run(self, notifs: List[Dict]):
+        args = self.args
+        parser = Parser()
+        expect = {n["status"]["id"] for n in notifs
+                  if n.get("type") == "mention" and n.get("status")
+                  and parser.parse(parser.clean_html(n["status"]["content"])) is not None}
+        rnd = random.Random(args.seed)
+        t0 = time.monotonic()
+        threading.Thread(target=self._sampler, args=(t0,), daemon=True).start()
+
+        # 도착: 고정 간격 또는 포아송
+        at = t0
+        for n in notifs:
+            at += rnd.expovariate(args.rate) if args.poisson else 1.0 / args.rate
+            wait = at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            if n.get("status"):
+                self.arrived[n["status"]["id"]] = time.monotonic()
+            self.listener.on_notification(n)
+        t_sent = time.monotonic() - t0
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline and len(expect - set(self._replied())) > 0:
+            time.sleep(0.05)
+        self.sh._wq_inv.join()
+        self.sh._wq_log.join()
+        self._stop.set()
+        self.report(notifs, expect, t_sent, time.monotonic() - t0)
+
+    def report(self, notifs: List[Dict], expect: set, t_sent: float, t_all: float):
+        replied = self._replied()
+        lat = sorted(replied[s] - self.arrived[s] for s in replied)
+        print(f"\nmentions {len(notifs)}  commands {len(expect)}  replied {len(replied)}"
+              f"  (sent in {t_sent:.1f}s, done in {t_all:.1f}s)")
+        print(f"workers {Config.WORKERS}  senders {Config.SENDER_WORKERS}"
+              f"  reply interval {Config.REPLY_INTERVAL_PER_USER}s")
+        print("notification → reply (s):  " + "  ".join(
+            f"p{p} {pct(lat, p):.3f}" for p in (50, 95, 99)) + f"  max {lat[-1] if lat else float('nan'):.3f}")
+
+        print(f"\n  {'t(s)':>6}{'lanes':>8}{'inv q':>8}{'log q':>8}{'heap':>8}{'replied':>9}")
+        step = max(1, len(self.samples) // 30)
+        rows = self.samples[::step]
+        if self.samples and rows[-1] is not self.samples[-1]:
+            rows.append(self.samples[-1])
+        for t, lanes, inv, log, heap, done in rows:
+            print(f"  {t:>6.1f}{lanes:>8}{inv:>8}{log:>8}{heap:>8}{done:>9}")
+
+        print(f"\nsheets API {self.ss.total_calls()}  " +
+              ", ".join(f"{k} {v}" for k, v in self.ss.calls.most_common()))
+        print(f"mastodon API {self.api.total_calls()}  " +
+              ", ".join(f"{k} {v}" for k, v in self.api.calls.most_common()))
+        print(f"injected  sheets {dict(self.sheet_faults.injected)}  mastodon {dict(self.post_faults.injected)}")
+        print("\n" + METRICS.summary())
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("file", nargs="?", help="알림 JSONL (없으면 합성)")
+    ap.add_argument("--synth", type=int, default=500, help="합성할 멘션 수")
+    ap.add_argument("--save", help="합성한 멘션을 이 JSONL로 저장")
+    ap.add_argument("--users", type=int, default=1000, help="가짜 문서의 유저 수")
+    ap.add_argument("--rate", type=float, default=20.0, help="초당 도착 멘션 수")
+    ap.add_argument("--poisson", action="store_true", help="도착 간격을 지수분포로")
+    ap.add_argument("--workers", type=int, default=Config.WORKERS)
+    ap.add_argument("--senders", type=int, default=Config.SENDER_WORKERS)
+    ap.add_argument("--interval", type=float, default=Config.REPLY_INTERVAL_PER_USER, help="유저별 답변 간격(초)")
+    ap.add_argument("--sheet-latency", type=float, default=0.3, help="시트 API 평균 지연(초)")
+    ap.add_argument("--sheet-429", type=float, default=0.0, help="시트 API 429 확률")
+    ap.add_argument("--sheet-fail", type=float, default=0.0, help="시트 API 500 확률")
+    ap.add_argument("--post-latency", type=float, default=0.15, help="게시 API 평균 지연(초)")
+    ap.add_argument("--post-429", type=float, default=0.0, help="게시 API 429 확률")
+    ap.add_argument("--post-fail", type=float, default=0.0, help="게시 API 실패 확률")
+    ap.add_argument("--read-quota", type=float, default=Config.SHEETS_READ_PER_MIN, help="시트 분당 읽기 한도(0=없음)")
+    ap.add_argument("--write-quota", type=float, default=Config.SHEETS_WRITE_PER_MIN, help="시트 분당 쓰기 한도(0=없음)")
+    ap.add_argument("--sample", type=float, default=0.5, help="큐 깊이 기록 간격(초)")
+    ap.add_argument("--timeout", type=float, default=120.0, help="보낸 뒤 답글을 기다릴 최대 시간(초)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    notifs = load(args.file) if args.file else synth(args.synth, args.users, args.seed)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            for n in notifs:
+                f.write(json.dumps(n, ensure_ascii=False) + "\n")
+    Harness(args).run(notifs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os, threading
+from collections import OrderedDict
+from typing import Optional
+
+class SeenStore:
+    """처리한 멘션(status id) 기록. 메모리 LRU + 추가 전용 파일.
+    한 줄에 'status_id notif_id'를 쓰고 줄마다 flush 하므로 프로세스가 죽어도 남는다.
+    파일 줄 수가 max_n의 2배를 넘으면 최근 max_n개만 남겨 다시 쓴다."""
+    def __init__(self, path: str, max_n: int):
+        self.path = path
+        self.max_n = max(1, int(max_n))
+        self.last_notif: Optional[str] = None  # 기록된 것 중 가장 큰 알림 id (재시작 후 따라잡기용)
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._load()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                self._lines += 1
+                self._remember(parts[0])
+                if len(parts) > 1 and parts[1] != "-":
+                    self._bump(parts[1])
+
+    def _remember(self, sid: str):
+        self._ids[sid] = None
+        self._ids.move_to_end(sid)
+        while len(self._ids) > self.max_n:
+            self._ids.popitem(last=False)
+
+    def _bump(self, nid: str):
+        try:
+            if self.last_notif is None or int(nid) > int(self.last_notif):
+                self.last_notif = nid
+        except ValueError:
+            pass
+
+    def __contains__(self, sid) -> bool:
+        return str(sid) in self._ids
+
+    def add(self, status_id, notif_id=None) -> bool:
+        """처음 보는 id면 기록하고 True, 이미 처리한 id면 False."""
+        sid = str(status_id)
+        with self._lock:
+            if sid in self._ids:
+                self._ids.move_to_end(sid)
+                return False
+            self._remember(sid)
+            if notif_id is not None:
+                self._bump(str(notif_id))
+            self._fh.write(f"{sid} {notif_id if notif_id is not None else '-'}\n")
+            self._fh.flush()
+            self._lines += 1
+            if self._lines > 2 * self.max_n:
+                self._compact()
+            return True
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        ids = list(self._ids)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i, sid in enumerate(ids):
+                nid = self.last_notif if i == len(ids) - 1 and self.last_notif else "-"
+                f.write(f"{sid} {nid}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._lines = len(ids)
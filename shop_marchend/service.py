@@ -1,61 +1,192 @@
 # -*- coding: utf-8 -*-
-import time, threading, random
-from typing import Dict, Tuple, Optional, List
+import time, threading, random, logging
+from functools import partial
+from types import MappingProxyType
+from typing import Dict, Tuple, Optional, List, Callable, Mapping, NamedTuple
 from .config import Config
 from .sheets import Sheets
 
+class Txn:
+    """명령 하나의 셀 증감과 기록 행을 모아 한 번에 커밋한다.
+    커밋 시 현재 값과 대조해 부족하면 ValueError, 시트 전송이 실패하면 전부 되돌린다.
+    기록 행(구매기록/공개레시피)은 셀 반영이 성공한 뒤에만 큐에 넣는다.
+    저널/로컬 저장소 모드에서는 셀과 한 번에 남긴다(재시작 때 둘 다 재생되거나 둘 다 없음)."""
+    def __init__(self, sh: Sheets):
+        self.sh = sh
+        self.deltas: Dict[Tuple[int, int], int] = {}
+        self._after: List[Callable] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def _add(self, r: int, c: int, d: int):
+        self.deltas[(r, c)] = self.deltas.get((r, c), 0) + d
+
+    def add_bal(self, acct: str, delta: int):
+        self._add(self.sh.row_of(Config.CURRENCY), self.sh.ensure_user(acct), delta)
+
+    def add_item(self, acct: str, item: str, qty: int):
+        if qty == 0:
+            return  # 0개는 할 일이 없다(가방에 없는 아이템이어도 실패가 아님)
+        r = self.sh.row_of(item, create=qty > 0)
+        if not r:
+            raise ValueError("아이템 수량 부족")  # 가방에 행조차 없는 아이템은 뺄 수 없다
+        self._add(r, self.sh.ensure_user(acct), qty)
+
+    def remove_item(self, acct: str, item: str, qty: int):
+        self.add_item(acct, item, -qty)
+
+    def record_purchase(self, acct: str, nick: str, item: str, qty: int, date_ts: str):
+        self._after.append(partial(self.sh.purchases_append, acct, nick, date_ts, item, qty))
+
+    def record_public_recipe(self, out_item: str, out_qty: int, key: str, acct: str, nick: str, date: str):
+        self._after.append(partial(self.sh.public_recipe_append, out_item, out_qty, key, acct, nick, date))
+
+    def commit(self):
+        after = self._after
+        if self.sh.journal is not None or self.sh.store is not None:
+            # 저널/로컬 저장소: 기록 행을 셀 변경과 같은 저널 기록(또는 SQLite 트랜잭션)에 넣는다.
+            # 인덱스 갱신/공개 키 등록은 가방 잠금을 잡기 전에 하고, 커밋이 거절되면 되돌린다
+            logs: List[dict] = []
+            for fn in after:
+                fn(out=logs)
+            try:
+                fut = self.sh.apply_deltas(self.deltas, logs)
+            except Exception:
+                self.sh.forget_logs(logs)
+                raise
+            after = []
+        else:
+            fut = self.sh.apply_deltas(self.deltas)
+        try:
+            fut.result()
+        except Exception:
+            self.sh.revert_deltas(self.deltas)
+            raise
+        for fn in after:
+            fn()
+
+class ShopItem(NamedTuple):
+    """물품목록 한 줄."""
+    buy: int        # 구매가
+    sell: int       # 판매가
+    desc: str       # 설명
+    typ: str        # 유형 (NORMAL/HEAL/GACHA)
+    eff: str        # 효과값
+    limit: int      # 일일한도 (0이면 무제한)
+
+
+class AliasSampler:
+    """Walker의 별칭(alias) 방법. 구축 O(n), 뽑기 O(1)."""
+    __slots__ = ("results", "prob", "alias")
+
+    def __init__(self, results: List[tuple], weights: List[float]):
+        n = len(results)
+        total = sum(weights)
+        if total <= 0:
+            weights, total = [1.0] * n, float(n)
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        prob = [1.0] * n
+        alias = list(range(n))
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        self.results, self.prob, self.alias = results, prob, alias
+
+    def draw(self) -> tuple:
+        i = random.randrange(len(self.results))
+        return self.results[i] if random.random() < self.prob[i] else self.results[self.alias[i]]
+
+
 class ShopService:
     """게임 규칙/계산 담당 (상점 캐시, 잔액/체력/아이템, 가챠, 구매한도 등)"""
     def __init__(self, sh: Sheets):
         self.sh = sh
-        self._cache: Dict[str, Tuple[int, int, str, str, str, int]] = {}
-        # (구매가, 판매가, 설명, 유형, 효과값, 일일한도)
+        # 상점 캐시: 만료돼도 바로 옛 값을 주고 뒤에서 새로 읽어 통째로 교체한다
+        self._cache: Optional[Mapping[str, ShopItem]] = None
         self._exp  = 0.0
+        self._refreshing = False
         self._lock = threading.RLock()
+        # 가챠 샘플러: (원본 테이블 dict, 테이블명 -> AliasSampler)
+        self._gacha: Tuple[Optional[dict], Dict[str, AliasSampler]] = (None, {})
         # 필수 행 확보
         self.sh.row_of(Config.CURRENCY)
         self.sh.row_of(Config.HP_NAME)
 
     # ---- 상점 캐시 ----
-    def shop_map(self):
-        with self._lock:
-            if time.time() > self._exp:
-                recs = self.sh.shop.get_all_records()
-                mp = {}
-                for r in recs:
-                    name = str(r.get("아이템명", "")).strip()
-                    if not name:
-                        continue
-
-                    # 구매가 / 판매가 파싱
-                    buy_raw = r.get("구매가")
-                    sell_raw = r.get("판매가")
-
-                    try:
-                        buy_price = int(buy_raw)
-                    except Exception:
-                        continue  # 구매가가 없으면 상점 품목으로 취급하지 않음
-
-                    try:
-                        sell_price = int(sell_raw) if sell_raw not in (None, "",) else buy_price
-                    except Exception:
-                        sell_price = max(1, buy_price // 2)
-
-                    desc = str(r.get("설명", "")).strip()
-                    typ = str(r.get("유형", "NORMAL")).strip().upper()
-                    eff = str(r.get("효과", "")).strip()
-                    limit = 0
-                    try:
-                        limit = int(r.get("일일한도") or 0)
-                    except Exception:
-                        limit = 0
-
-                    # ▼ 튜플 구성: (구매가, 판매가, 설명, 유형, 효과, 일일한도)
-                    mp[name] = (buy_price, sell_price, desc, typ, eff, limit)
-
-                self._cache = mp
-                self._exp = time.time() + 600  # 캐시 TTL, 기존 값을 사용하세요
-            return self._cache
+    def shop_map(self) -> Mapping[str, ShopItem]:
+        mp = self._cache
+        if mp is None:
+            # 최초 1회만 동기로 읽는다
+            with self._lock:
+                if self._cache is None:
+                    self._load_shop()
+                return self._cache
+        if time.time() > self._exp and not self._refreshing:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_shop, daemon=True).start()
+        return mp
+
+    def _refresh_shop(self):
+        try:
+            self._load_shop()
+        except Exception:
+            logging.exception("shop refresh failed")
+            self._exp = time.time() + min(60, Config.SHOP_CACHE_TTL)  # 잠시 뒤 재시도
+        finally:
+            self._refreshing = False
+
+    def _load_shop(self):
+        recs = self.sh.records(self.sh.shop)
+        mp: Dict[str, ShopItem] = {}
+        for r in recs:
+            name = str(r.get("아이템명", "")).strip()
+            if not name:
+                continue
+
+            # 구매가 / 판매가 파싱
+            buy_raw = r.get("구매가")
+            sell_raw = r.get("판매가")
+
+            try:
+                buy_price = int(buy_raw)
+            except Exception:
+                continue  # 구매가가 없으면 상점 품목으로 취급하지 않음
+
+            try:
+                sell_price = int(sell_raw) if sell_raw not in (None, "",) else buy_price
+            except Exception:
+                sell_price = max(1, buy_price // 2)
+
+            desc = str(r.get("설명", "")).strip()
+            typ = str(r.get("유형", "NORMAL")).strip().upper()
+            eff = str(r.get("효과", "")).strip()
+            limit = 0
+            try:
+                limit = int(r.get("일일한도") or 0)
+            except Exception:
+                limit = 0
+
+            mp[name] = ShopItem(buy_price, sell_price, desc, typ, eff, limit)
+
+        # 읽기 전용 뷰로 한 번에 교체 (읽는 쪽은 잠금 불필요)
+        self._cache = MappingProxyType(mp)
+        self._exp = time.time() + Config.SHOP_CACHE_TTL
+
+    # ---- 트랜잭션 ----
+    def txn(self) -> Txn:
+        return Txn(self.sh)
 
     # ---- 잔액/아이템/체력 ----
     def balance(self, acct: str) -> int:
@@ -75,15 +206,12 @@ class ShopService:
     def transfer_bal(self, src: str, dst: str, amount: int):
         if amount <= 0:
             raise ValueError("amount must be positive")
-        sc = self.sh.ensure_user(src)
-        dc = self.sh.ensure_user(dst)
-        row = self.sh.row_of(Config.CURRENCY)
-        s_cur = self.sh.read_int(row, sc)
-        if s_cur < amount:
+        if self.balance(src) < amount:
             raise ValueError("잔액 부족")
-        self.sh.write_int(row, sc, s_cur - amount)
-        d_cur = self.sh.read_int(row, dc)
-        self.sh.write_int(row, dc, d_cur + amount)
+        # 양쪽 잔액을 한 번에 커밋
+        with self.txn() as tx:
+            tx.add_bal(src, -amount)
+            tx.add_bal(dst, amount)
 
     def add_item(self, acct: str, item: str, qty: int):
         c = self.sh.ensure_user(acct)
@@ -93,11 +221,12 @@ class ShopService:
 
     def remove_item(self, acct: str, item: str, qty: int):
         c = self.sh.ensure_user(acct)
-        r = self.sh.row_of(item)
+        r = self.sh.row_of(item, create=False)
         cur = self.sh.read_int(r, c)
         if cur < qty:
             raise ValueError("아이템 수량 부족")
-        self.sh.write_int(r, c, cur - qty)
+        if r:
+            self.sh.write_int(r, c, cur - qty)
 
     # 체력
     def hp(self, acct: str) -> int:
@@ -126,10 +255,8 @@ class ShopService:
         self.sh.purchases_append(acct, nick, date_ts, item, qty)
 
     # ---- 가챠 엔진 ----
-    def gacha_roll(self, table: str):
-        rows = self.sh.gacha_table(table)
-        if not rows:
-            return ("", 0, "아무 일도 일어나지 않았다…")
+    @staticmethod
+    def _compile_gacha(rows: List[Dict]) -> AliasSampler:
         weights, results = [], []
         for r in rows:
             item = str(r.get("보상아이템", "")).strip()
@@ -145,6 +272,16 @@ class ShopService:
             script = str(r.get("스크립트", r.get("메시지", ""))).strip()
             results.append((item, qty, script))
             weights.append(max(0.0, w))
-        if sum(weights) == 0:
-            weights = [1.0] * len(results)
-        return random.choices(results, weights=weights, k=1)[0]
+        return AliasSampler(results, weights)
+
+    def gacha_roll(self, table: str):
+        tables = self.sh.gacha_tables()
+        src, samplers = self._gacha
+        if src is not tables:
+            # 시트를 다시 읽었으면 모든 테이블의 샘플러를 새로 만든다
+            samplers = {name: self._compile_gacha(rows) for name, rows in tables.items() if rows}
+            self._gacha = (tables, samplers)
+        smp = samplers.get(table)
+        if smp is None:
+            return ("", 0, "아무 일도 일어나지 않았다…")
+        return smp.draw()
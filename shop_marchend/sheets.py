@@ -1,25 +1,36 @@
 # -*- coding: utf-8 -*-
 import logging, threading, queue, re, time, random
-from typing import List, Dict, Optional, Tuple, Iterable
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Optional, Tuple, Iterable, Set
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from gspread.utils import rowcol_to_a1
+from gspread.utils import rowcol_to_a1, a1_to_rowcol
 from gspread.exceptions import WorksheetNotFound
 from .config import Config
+from .store import LocalStore
+from .journal import Journal
+from .metrics import METRICS, SHEETS_CALLS
+from .tracing import TRACER
+from .quota import Quota, retryable, P_INV, P_USERS, P_BG, P_LOG
+from .utils_time import today_str
 
 def _a1(r:int,c:int)->str:
     return rowcol_to_a1(r,c)  # Worksheet.update에는 시트명 없이 A1만!
 
 class Sheets:
-    """읽기 병렬 OK, 쓰기는 분리 큐(인벤토리/로그)로 직렬·배치 전송."""
-    def __init__(self):
-        scope = ["https://spreadsheets.google.com/feeds",
-                 "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(Config.CREDS_JSON, scope)
-        cli = gspread.authorize(creds)
-
-        # 단일 문서
-        self.ss = cli.open(Config.MASTER_SHEET)
+    """읽기 병렬 OK, 쓰기는 분리 큐(인벤토리/로그)로 직렬·배치 전송.
+    STORE="sqlite"이면 로컬 SQLite가 기본 저장소가 되고, 쓰기 큐는 시트로 보내는 미러 역할만 한다.
+    sheets 모드에서는 큐에 넣는 작업을 먼저 저널 파일에 남겨, 죽었다 살아나도 다시 보낸다.
+    시트 API 호출은 모두 Quota(분당 읽기/쓰기 한도, 429 백오프)를 거친다."""
+    def __init__(self, ss=None):
+        # 단일 문서. ss를 넘기면(가짜 문서 등) 인증 없이 그걸 쓴다
+        if ss is None:
+            from oauth2client.service_account import ServiceAccountCredentials
+            scope = ["https://spreadsheets.google.com/feeds",
+                     "https://www.googleapis.com/auth/drive"]
+            creds = ServiceAccountCredentials.from_json_keyfile_name(Config.CREDS_JSON, scope)
+            ss = gspread.authorize(creds).open(Config.MASTER_SHEET)
+        self.quota = Quota(Config.SHEETS_READ_PER_MIN, Config.SHEETS_WRITE_PER_MIN)
+        self.ss = self.quota.wrap(ss)
 
         # 워크시트들(없으면 생성 + 헤더)
         self.shop = self._get_or_create_ws(Config.WS_SHOP,
@@ -33,15 +44,74 @@ class Sheets:
         self.gacha= self._get_or_create_ws(Config.WS_GACHA, ["테이블","보상아이템","수량","확률","스크립트"]) # 가챠시트
         self.users = self._get_or_create_ws(Config.WS_USERS, ["아이디", "닉네임", "최초활동", "최근활동"]) # 유저목록시트
 
-        # 캐시
-        self._hdr: Optional[List[str]] = None
-        self._row_cache: Dict[str,int] = {}
+        # 로컬 기본 저장소(선택)
+        self.store: Optional[LocalStore] = LocalStore(Config.SQLITE_PATH) if Config.STORE == "sqlite" else None
+        # 시트 모드의 쓰기 저널(선택). 둘 중 하나가 아직 시트에 안 나간 작업 목록(outbox)을 맡는다
+        self.journal: Optional[Journal] = (Journal(Config.JOURNAL_FILE)
+                                           if self.store is None and Config.JOURNAL_FILE else None)
+        self._outbox = self.store if self.store is not None else self.journal
+
+        # 캐시: 가방 시트 전체를 메모리 행렬로 보관 (행=아이템, 열=유저)
+        self._inv_lock = threading.RLock()
+        self._hdr: List[str] = []
+        self._col_cache: Dict[str,int] = {}            # acct -> 열
+        self._row_cache: Dict[str,int] = {}            # 아이템명 -> 행
+        self._mat: Dict[Tuple[int,int], int] = {}      # (행, 열) -> 수량
+        self._n_rows = 0
+        self._inv_gen = 0                              # 큐에 넣은 인벤토리 쓰기 수(재적재 중 쓰기 감지용)
+
+        # get_all_records 단일 비행: 같은 워크시트를 동시에 읽으면 진행 중인 요청 하나를 함께 기다린다
+        self._sf_lock = threading.Lock()
+        self._sf_inflight: Dict[str, Future] = {}
+        self._sf_last: Dict[str, Tuple[float, List[Dict]]] = {}
 
         # 쓰기 큐: 인벤토리/로그
         self._wq_inv: queue.Queue = queue.Queue()
         self._wq_log: queue.Queue = queue.Queue()
         threading.Thread(target=self._writer_inv, daemon=True).start()
         threading.Thread(target=self._writer_log, daemon=True).start()
+        METRICS.gauge("wq_inv", self._wq_inv.qsize)
+        METRICS.gauge("wq_log", self._wq_log.qsize)
+        METRICS.gauge("sheets_backoff_read", lambda: self.quota.read.fails)
+        METRICS.gauge("sheets_backoff_write", lambda: self.quota.write.fails)
+
+        # 날짜별 인덱스: (acct, 아이템, 날짜) -> 구매 수량. KST 자정이 지나면 지난 날짜는 버린다
+        self._day_lock = threading.Lock()
+        self._day = today_str()
+        self._purs_idx: Dict[Tuple[str,str,str], int] = {}
+        self._jobs_done: Set[str] = set()   # 오늘 아르바이트를 마친 acct
+
+        # 레시피 인덱스: 정규화 재료키 -> (출력아이템, 출력수량) / 공개레시피 재료키 집합
+        self._rec_lock = threading.RLock()        # 인덱스 교체/공개 키 등록(짧게만 잡는다)
+        self._rec_load_lock = threading.Lock()    # TTL 재적재는 한 스레드만
+        self._recipes: Dict[str, Tuple[str,int]] = {}
+        self._pub_keys: Set[str] = set()
+        self._pub_local: Set[str] = set()   # 이 프로세스가 기록했지만 아직 시트에서 못 본 키
+        self._rec_exp = 0.0
+
+        # 가챠 테이블: 테이블명 -> 행 목록 (다시 읽을 때마다 새 dict로 교체)
+        self._gacha_lock = threading.RLock()
+        self._gacha: Dict[str, List[Dict]] = {}
+        self._gacha_exp = 0.0
+
+        # 유저목록: acct -> 행. 최근활동/닉네임 갱신과 신규 행은 메모리에 모았다가 주기적으로 일괄 전송
+        self._user_lock = threading.Lock()
+        self._user_row: Dict[str,int] = {}
+        self._user_dirty: Dict[str, Tuple[str,str]] = {}          # acct -> (닉네임, 최근활동)
+        self._user_new: Dict[str, Tuple[str,str,str]] = {}        # acct -> (닉네임, 최초활동, 최근활동)
+        self._user_adding: Dict[str, Tuple[str,str,str]] = {}     # 추가 전송 중인 신규 acct
+
+        # 로컬 저장소에 가방이 있으면 거기서, 없으면 시트에서 읽는다(저널에 남은 값은 그 위에 덮는다)
+        self.load_inv(from_sheet=self.store is None or not self.store.has_grid(), startup=True)
+        self.load_purchases()
+        self.load_jobs()
+        self.load_recipes()
+        self.load_gacha()
+        self.load_users()
+        self._replay_outbox()
+        threading.Thread(target=self._writer_users, daemon=True).start()
+        if self._reload_sec() > 0:
+            threading.Thread(target=self._reloader_inv, daemon=True).start()
 
         # 필수 행 보장(통화, 체력)
         self.row_of(Config.CURRENCY)
@@ -55,54 +125,356 @@ class Sheets:
             ws = self.ss.add_worksheet(title=title, rows=1000, cols=50)
             if headers:
                 ws.update(f"A1:{chr(64+len(headers))}1", [headers])
-        return ws
+        # 한도 스케줄러 안쪽에서 계측: 재시도도 실제 호출 하나씩으로 센다
+        return self.quota.wrap(METRICS.wrap(ws, "sheets", SHEETS_CALLS))
+
+    # ---- 읽기 합치기(single-flight) ----
+    def records(self, ws, fresh: Optional[float] = None) -> List[Dict]:
+        """ws.get_all_records()를 워크시트별로 합쳐 부른다.
+        이미 같은 시트를 읽는 중이면 그 결과를 함께 받고, fresh초 이내에 읽은 결과가 있으면 재사용한다.
+        돌려받은 목록은 여러 호출자가 공유하므로 수정하지 말 것."""
+        if fresh is None:
+            fresh = Config.READ_COALESCE_SEC
+        key = ws.title
+        with self._sf_lock:
+            last = self._sf_last.get(key)
+            if last and fresh > 0 and time.monotonic() - last[0] <= fresh:
+                return last[1]
+            fut = self._sf_inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._sf_inflight[key] = fut
+        if not leader:
+            with TRACER.span("read_wait", sheet=key):  # 다른 스레드가 읽는 중인 결과를 기다림
+                return fut.result()
+        try:
+            recs = ws.get_all_records()
+        except Exception as e:
+            with self._sf_lock:
+                self._sf_inflight.pop(key, None)
+            snap = self.store.snapshot_get(key) if self.store is not None else None
+            if snap is None:
+                fut.set_exception(e)
+                raise
+            # 시트를 못 읽으면 로컬 스냅샷으로 버틴다
+            logging.warning(f"{key}: sheet read failed, serving local snapshot")
+            fut.set_result(snap)
+            return snap
+        if self.store is not None:
+            self.store.snapshot_put(key, recs)
+        with self._sf_lock:
+            self._sf_last[key] = (time.monotonic(), recs)
+            self._sf_inflight.pop(key, None)
+        fut.set_result(recs)
+        return recs
+
+    # ---- 인벤토리 행렬 적재 ----
+    def load_inv(self, from_sheet: bool = True, startup: bool = False) -> bool:
+        """가방을 한 번에 읽어 메모리 행렬과 행/열 인덱스를 다시 만든다.
+        시트에서 읽을 때는 대기 중인 쓰기가 모두 반영된 뒤여야 최신 값을 덮어쓰지 않는다.
+        읽기는 잠금 밖에서 하고, 그새 새 쓰기가 들어왔으면 읽은 것을 버리고 False.
+        startup=True(시작할 때 한 번)면 저널에 남은, 시트에 아직 없는 값을 덮어 쓴 채로 적재한다."""
+        if from_sheet:
+            self._wq_inv.join()
+        with self._inv_lock:
+            if from_sheet:
+                if self._wq_inv.unfinished_tasks:
+                    return False
+                if not startup and self._outbox is not None and self._outbox.has_pending("inv"):
+                    return False  # 시트에 아직 못 보낸 로컬 값이 있으면 시트가 더 낡았다
+            gen = self._inv_gen
+        if from_sheet:
+            grid = self.inv.get_all_values()  # 네트워크 읽기 동안 명령들의 쓰기를 막지 않는다
+            if startup and self.journal is not None:
+                grid = self._overlay(grid, self.journal.latest_cells())
+        else:
+            grid = self.store.grid()
+        hdr = [str(v).strip() for v in grid[0]] if grid else []
+        cols: Dict[str,int] = {}
+        for c, v in enumerate(hdr, 1):
+            if v:
+                cols.setdefault(v, c)
+        rows: Dict[str,int] = {}
+        mat: Dict[Tuple[int,int], int] = {}
+        for r, line in enumerate(grid, 1):
+            name = str(line[0]).strip() if line else ""
+            if name:
+                rows.setdefault(name, r)
+            if r == 1:
+                continue
+            for c in range(2, len(line) + 1):
+                try:
+                    mat[(r, c)] = int(line[c - 1])
+                except Exception:
+                    pass
+        with self._inv_lock:
+            if self._inv_gen != gen:
+                return False  # 읽는 사이에 쓰기가 들어왔다: 이번 적재는 버린다
+            if from_sheet and self.store is not None:
+                self.store.replace_grid(grid)  # 운영자가 시트에서 고친 값을 로컬에도
+            self._hdr, self._col_cache, self._row_cache, self._mat = hdr, cols, rows, mat
+            self._n_rows = len(grid)
+            self._n_rows_cap = int(getattr(self.inv, "row_count", 0) or len(grid))
+            self._n_cols_cap = int(getattr(self.inv, "col_count", 0) or len(hdr))
+            return True
+
+    @staticmethod
+    def _overlay(grid: List[List[str]], cells: Dict[str, list]) -> List[List[str]]:
+        # A1 -> [[값]] 을 격자 위에 덮는다(모자란 행/열은 늘려서)
+        grid = [list(line) for line in grid]
+        for rng, vals in cells.items():
+            r, c = a1_to_rowcol(rng)
+            while len(grid) < r:
+                grid.append([])
+            line = grid[r - 1]
+            line.extend([""] * (c - len(line)))
+            line[c - 1] = vals[0][0] if vals and vals[0] else ""
+        return grid
+
+    def _reload_sec(self) -> float:
+        return Config.MIRROR_PULL_SEC if self.store is not None else Config.INV_RELOAD_SEC
+
+    def _reloader_inv(self):
+        # 운영자가 시트에서 직접 고친 값을 주기적으로 반영
+        self.quota.set_priority(P_BG)
+        while True:
+            time.sleep(self._reload_sec())
+            try:
+                self.load_inv()
+            except Exception:
+                logging.exception("inventory reload failed")
 
     # ---- 인벤토리 유틸 ----
     def headers(self) -> List[str]:
-        if self._hdr is None:
-            self._hdr = self.inv.row_values(1)
         return self._hdr
 
     def ensure_user(self, acct: str) -> int:
-        hdr = self.headers()
-        if acct not in hdr:
-            col = len(hdr) + 1
-            self.inv.update_cell(1, col, acct)
-            self._hdr = None
-            return col
-        return hdr.index(acct) + 1
-
-    def row_of(self, item: str) -> int:
-        if item in self._row_cache:
-            return self._row_cache[item]
-        col1 = self.inv.col_values(1)
-        for i, v in enumerate(col1, 1):
-            if v.strip() == item:
-                self._row_cache[item] = i
-                return i
-        r = len(col1) + 1
-        self.inv.update_cell(r, 1, item)
-        self._row_cache[item] = r
-        return r
+        c = self._col_cache.get(acct)
+        if c is not None:
+            return c
+        with self._inv_lock:
+            c = self._col_cache.get(acct)
+            if c is None:
+                c = len(self._hdr) + 1
+                self._hdr.append(acct)
+                self._col_cache[acct] = c
+                # 헤더 셀도 인벤토리 큐로: 같은 열의 값 쓰기보다 먼저 나가고, 다른 쓰기와 함께 배치된다
+                self._put_inv([(1, c, acct)])
+            return c
 
-    def read_int(self, r: int, c: int) -> int:
-        v = self.inv.cell(r, c).value
-        try:
-            return int(v)
-        except Exception:
+    def row_of(self, item: str, create: bool = True) -> int:
+        """아이템 행 번호. 없으면 create=True일 때만 새 행을 잡고, 아니면 0(=보유 0)을 돌려준다.
+        조회만 할 때(판매/제작 검증, 사용 등)는 create=False로 불러 시트에 빈 행이 생기지 않게 한다."""
+        r = self._row_cache.get(item)
+        if r is not None:
+            return r
+        if not create:
             return 0
+        with self._inv_lock:
+            r = self._row_cache.get(item)
+            if r is None:
+                r = self._n_rows + 1
+                self._n_rows = r
+                self._row_cache[item] = r
+                self._put_inv([(r, 1, item)])
+            return r
+
+    def read_int(self, r: int, c: int) -> int:
+        # 메모리 행렬에서 바로 읽는다 (API 호출 없음). r=0(없는 아이템)은 항상 0
+        return self._mat.get((r, c), 0)
 
     # ---- 인벤토리 쓰기(시트명 없이 A1) ----
     def write_int(self, r, c, val: int):
         if val < 0:
             val = 0
-        a1 = rowcol_to_a1(r, c)  # 시트명 붙이지 말 것
-        # 0도 "0"으로 기록하려면 str(val); 빈칸으로 하려면 "" 사용
-        self._wq_inv.put({"range": a1, "values": [[str(val)]]})
+        with self._inv_lock:
+            # 0도 "0"으로 기록하려면 str(val); 빈칸으로 하려면 "" 사용
+            jid = self._put_inv([(r, c, str(val))])
+            # 행렬은 즉시 갱신(write-through), 시트는 큐로 배치 전송
+            self._mat[(r, c)] = val
+        # 성공 답변이 시트 반영보다 먼저 나가므로, 저널이 디스크에 내려간 뒤 돌아간다(잠금 밖에서 묶어 fsync)
+        if self.journal is not None:
+            self.journal.sync(jid)
+
+    def _put_inv(self, cells: List[Tuple[int,int,str]], done: Optional[Future] = None,
+                 logs: Optional[List[dict]] = None) -> int:
+        """인벤토리 쓰기 작업 하나(쪼개지지 않음)를 큐에 넣는다.
+        로컬 저장소가 있으면 먼저 거기에 커밋하고(실패 시 예외), done은 그 자리에서 완료된다.
+        저널을 쓰면 기록만 해 두고 fsync는 부른 쪽이 필요할 때 한다(돌려준 id로 journal.sync).
+        logs({"ws","row"} 목록)는 셀과 한 번에 남긴다: 로컬 저장소면 같은 SQLite 트랜잭션,
+        저널이면 같은 저널 기록이라 죽었다 살아나도 함께 재생된다."""
+        data = [{"range": rowcol_to_a1(r, c), "values": [[v]]} for r, c, v in cells]  # 시트명 붙이지 말 것
+        job = {"data": data, "done": done,
+               "cmd": METRICS.current(), "trace": TRACER.current()}  # 계측용 명령 이름 / 추적
+        self._inv_gen += 1  # 부르는 쪽이 _inv_lock을 잡고 있다
+        if self.store is not None:
+            job["oid"], log_oids = self.store.put_cells(cells, {"data": data}, logs or ())
+            job["done"] = None
+            if done is not None:
+                done.set_result(None)
+            self._queue_inv(job)
+            for l, oid in zip(logs or (), log_oids):
+                self._queue_log(dict(l, oid=oid, cmd=job["cmd"], trace=job["trace"]))
+            return job["oid"]
+        elif self.journal is not None:
+            rec = {"data": data, "logs": logs} if logs else {"data": data}
+            job["oid"] = self.journal.put("inv", rec, sync=False)
+        self._queue_linked(job, logs or [])
+        return job.get("oid") or 0
+
+    def _queue_linked(self, job: dict, logs: List[dict], sent: Iterable = ()):
+        # 셀 작업과 기록 행들이 저널 기록 하나를 나눠 가지면 조각("data" / 기록 행 번호)별로 ack하고,
+        # 저널은 조각이 다 나가야 그 기록을 지운다. sent: 지난 실행에서 이미 나간 조각
+        sent = set(sent)
+        if logs:
+            job["part"] = "data"
+        if "data" not in sent:
+            self._queue_inv(job)
+        for k, l in enumerate(logs):
+            if k not in sent:
+                self._queue_log({"ws": l["ws"], "row": l["row"], "oid": job.get("oid"), "part": k,
+                                 "cmd": job.get("cmd"), "trace": job.get("trace")})
+
+    def _queue_inv(self, job: dict):
+        if job["data"]:  # 기록 행만 있는 커밋이면 셀 작업은 없다
+            self._wq_inv.put(job)
+            TRACER.mark("enqueue_inv", depth=self._wq_inv.qsize())
+
+    def _queue_log(self, job: dict):
+        self._wq_log.put(job)
+        TRACER.mark("enqueue_log", sheet=job["ws"], depth=self._wq_log.qsize())
+
+    def _put_log(self, ws: str, row: list, out: Optional[List[dict]] = None):
+        if out is not None:
+            out.append({"ws": ws, "row": row})  # 부른 쪽이 셀 작업과 한 저널 기록으로 넣는다
+            return
+        job = {"ws": ws, "row": row, "cmd": METRICS.current(), "trace": TRACER.current()}
+        if self.store is not None:
+            job["oid"] = self.store.put_log(ws, row)
+        elif self.journal is not None:
+            job["oid"] = self.journal.put("log", {"ws": ws, "row": row})
+        self._queue_log(job)
+
+    # 기록 시트 열 순서 (_put_log에 넣는 행과 같은 순서)
+    _LOG_FIELDS = {"jobs": ("유저", "닉네임", "날짜", "지급코인"),
+                   "purs": ("유저", "닉네임", "날짜", "아이템", "수량"),
+                   "pubr": ("출력아이템", "출력수량", "재료키", "발견자", "발견자닉", "날짜")}
+
+    def _pending_logs(self, ws: str) -> List[list]:
+        # 아직 시트에 반영되지 않은 기록 행(재시작 직후 인덱스에 포함해야 함)
+        if self._outbox is None:
+            return []
+        rows = [j["row"] for _, j in self._outbox.pending("log") if j.get("ws") == ws]
+        rows += [l["row"] for _, j in self._outbox.pending("inv")
+                 for k, l in enumerate(j.get("logs", ())) if l["ws"] == ws and k not in j.get("sent", ())]
+        return rows
+
+    def _log_records(self, key: str) -> List[Dict]:
+        """기록 시트의 전체 행(레코드). sqlite 모드면 로컬 logs 테이블이 원본이다
+        (처음 띄울 때만 시트 내용을 가져와 채운다). 시트 모드면 시트 + 아직 못 보낸 행."""
+        fields = self._LOG_FIELDS[key]
+        if self.store is not None:
+            if not self.store.has_logs(key):
+                self.store.seed_logs(key, [[r.get(f, "") for f in fields] for r in self.records(getattr(self, key))])
+            return [dict(zip(fields, row)) for row in self.store.logs(key)]
+        pend = [dict(zip(fields, row)) for row in self._pending_logs(key)]
+        return list(self.records(getattr(self, key))) + pend
+
+    def _replay_outbox(self):
+        # 지난 실행에서 시트에 못 보낸 작업을 순서대로 다시 큐에 넣는다
+        if self._outbox is None:
+            return
+        grid = self.store.grid() if self.store is not None else []
+        latest = self.journal.latest_cells() if self.journal is not None else {}
+        for q, wq in (("inv", self._wq_inv), ("log", self._wq_log)):
+            jobs = self._outbox.pending(q)
+            for oid, job in jobs:
+                job = dict(job, oid=oid)
+                job.setdefault("done", None)
+                if q == "inv":
+                    # 그 뒤에 더 새 값이 시트에 나갔을 수 있으니 셀 값은 지금 로컬 값으로 보낸다
+                    for d in job["data"]:
+                        r, c = a1_to_rowcol(d["range"])
+                        if r <= len(grid) and c <= len(grid[r - 1]):
+                            d["values"] = [[grid[r - 1][c - 1]]]
+                        elif d["range"] in latest:
+                            d["values"] = latest[d["range"]]
+                    self._queue_linked(job, job.pop("logs", None) or [], job.pop("sent", ()))
+                    continue
+                wq.put(job)
+            if jobs:
+                logging.info(f"replaying {len(jobs)} unsent {q} job(s)")
+
+    def _ack(self, jobs: List[dict]):
+        if self._outbox is None:
+            for j in jobs:
+                j["acked"] = True
+            return
+        ids = [j.get("oid") for j in jobs if "part" not in j]
+        parts = [(j.get("oid"), j["part"]) for j in jobs if "part" in j]  # 저널 모드에만 있다
+        if parts:
+            self._outbox.ack(ids, parts)
+        else:
+            self._outbox.ack(ids)
+        for j in jobs:
+            j["acked"] = True  # 작성기가 실패해도 다시 보내지 않는다(_carry_failed)
+
+    def apply_deltas(self, deltas: Dict[Tuple[int,int], int], logs: Optional[List[dict]] = None) -> Future:
+        """여러 셀 증감을 한 작업으로 적용한다.
+        현재 값과 대조해 하나라도 음수가 되면 아무것도 바꾸지 않고 ValueError.
+        통과하면 행렬에 즉시 반영하고, 시트에는 쪼개지지 않는 작업 하나로 보낸다.
+        logs({"ws","row"} 목록, 저널/로컬 저장소 모드)는 셀과 한 번에 남긴다(_put_inv).
+        반환된 Future는 작업이 확정되면 완료된다.
+        - 로컬 저장소: 로컬 커밋 시점(바로 완료된 Future)
+        - 저널: 저널이 디스크에 내려간 시점. 시트 전송은 뒤에서 재시도하며 되돌리지 않는다
+        - 둘 다 없으면: 해당 batch_update가 끝난 시점(실패 시 예외)"""
+        cur_row = self._row_cache.get(Config.CURRENCY)
+        with self._inv_lock:
+            new_vals: Dict[Tuple[int,int], int] = {}
+            for (r, c), d in deltas.items():
+                nv = self._mat.get((r, c), 0) + d
+                if nv < 0:
+                    raise ValueError("잔액 부족" if r == cur_row else "아이템 수량 부족")
+                new_vals[(r, c)] = nv
+            fut: Future = Future()
+            if not new_vals and not logs:
+                fut.set_result(None)
+                return fut
+            cells = [(r, c, str(v)) for (r, c), v in new_vals.items()]
+            jid = self._put_inv(cells, fut if self.journal is None else None, logs)
+            self._mat.update(new_vals)
+        if self.journal is not None:
+            # fsync는 잠금 밖에서 묶어서. 작업은 이미 큐에 있어 시트로 나가므로 실패해도 되돌리지 않는다
+            try:
+                self.journal.sync(jid)
+            except OSError:
+                logging.exception("journal sync failed")
+            fut.set_result(None)
+        return fut
+
+    def forget_logs(self, logs: List[dict]):
+        """out=으로 모아 두고 커밋하지 못한 기록 행을 인덱스에서 되돌린다(구매 누계, 공개레시피 키)."""
+        for l in logs:
+            row = l["row"]
+            if l["ws"] == "purs":
+                k = (row[0], row[3], str(row[2])[:10])
+                with self._day_lock:
+                    if k in self._purs_idx:
+                        self._purs_idx[k] -= int(row[4])
+            elif l["ws"] == "pubr":
+                with self._rec_lock:
+                    self._pub_keys.discard(row[2])
+                    self._pub_local.discard(row[2])
+
+    def revert_deltas(self, deltas: Dict[Tuple[int,int], int]):
+        """apply_deltas로 반영한 행렬 값을 되돌린다(시트 전송 실패 시)."""
+        with self._inv_lock:
+            for cell, d in deltas.items():
+                self._mat[cell] = self._mat.get(cell, 0) - d
 
     # ---- 배치 drain helpers ----
-    def _drain_dict_jobs(self, q:queue.Queue, first, budget_ms:int, max_n:int):
-        batch = [first]
+    def _drain_dict_jobs(self, q:queue.Queue, batch:list, budget_ms:int, max_n:int):
         deadline = time.monotonic() + budget_ms/1000.0
         while len(batch) < max_n and time.monotonic() < deadline:
             try:
@@ -112,57 +484,181 @@ class Sheets:
         return batch
 
     # ---- writers ----
+    def _batch_max(self, busy: bool) -> int:
+        # 한도에 밀리는 중이면 낱개로 쪼개지 않고 배치를 키운다(호출 수는 그대로, 한 번에 더 많이)
+        return Config.SHEETS_BATCH_MAX_BUSY if busy else Config.SHEETS_BATCH_MAX
+
     def _writer_inv(self):
+        self.quota.set_priority(P_INV)
+        carry: List[dict] = []   # 429/5xx로 못 보낸 작업: 다음 배치 앞에 붙여 다시 보낸다
         while True:
-            first = self._wq_inv.get()
-            if first is None:
-                break
+            if carry:
+                batch, carry = carry, []
+            else:
+                first = self._wq_inv.get()
+                if first is None:
+                    break
+                batch = [first]
             try:
-                batch = self._drain_dict_jobs(self._wq_inv, first, 30, 200)
-                # 같은 셀은 마지막 값만 남기기
+                # 쓰기 토큰이 날 때까지 기다린 만큼 쌓인 작업도 이번 배치에 함께
+                busy = self.quota.wait_ready("write") > 0 or len(batch) > 1
+                batch = self._drain_dict_jobs(self._wq_inv, batch, 30, self._batch_max(busy))
+                # 같은 셀은 마지막 값만 남기기 (작업은 쪼개지 않는다)
                 coalesced: Dict[str, List[List[str]]] = {}
-                for j in batch:  # j는 dict
-                    coalesced[j["range"]] = j["values"]
+                for j in batch:  # j는 {"data": [...], "done": Future|None}
+                    for d in j["data"]:
+                        coalesced[d["range"]] = d["values"]
                 data = [{"range": rng, "values": vals} for rng, vals in coalesced.items()]
                 try:
-                    # Worksheet.batch_update는 시트명 없는 A1 범위를 받는다
-                    self.inv.batch_update(data)
-                except Exception:
-                    for j in data:
-                        self.inv.update(j["range"], j["values"])
-            except Exception:
+                    self._grow_for(data)
+                    # Worksheet.batch_update는 시트명 없는 A1 범위를 받는다 (호출 하나를 묶인 명령들이 나눠 가진다)
+                    with METRICS.attributed(j.get("cmd") for j in batch), \
+                            TRACER.activate(j.get("trace") for j in batch), \
+                            TRACER.span("flush_inv", jobs=len(batch), cells=len(data)):
+                        self.inv.batch_update(data)
+                    for j in batch:
+                        self._resolve(j, None)
+                    self._ack(batch)
+                except Exception as e:
+                    if retryable(e):
+                        # 한도/서버 오류가 백오프 뒤에도 계속되면: 쪼개 보내 봐야 호출만 늘어난다.
+                        # 기다리는 명령이 있는 작업은 실패로 돌려주고(명령 쪽에서 되돌림), 나머지는 다음 배치로
+                        logging.warning(f"inventory batch deferred ({len(batch)} jobs): {e!r}")
+                        for j in batch:
+                            if j.get("done") is not None:
+                                self._ack([j])
+                                self._resolve(j, e)
+                            else:
+                                carry.append(j)
+                        continue
+                    # 작업(=명령) 단위로 다시 보낸다: 한 명령은 통째로 반영되거나 통째로 실패
+                    for j in batch:
+                        err = self._send_job(lambda: self.inv.batch_update(j["data"]), j)
+                        if err is not None:
+                            logging.error(f"inventory job failed: {err!r}")
+                            if retryable(err):
+                                if j.get("done") is None:
+                                    carry.append(j)  # outbox에 남은 작업: 다음 배치로 다시 보낸다
+                                    continue
+                                self._ack([j])  # 명령 쪽에서 되돌리므로 저널에서도 지운다(그 밖의 오류는 _send_job이 지움)
+                        self._resolve(j, err)
+            except Exception as e:
                 logging.exception("inventory writer failed")
+                carry = self._carry_failed(batch, e)
             finally:
-                for _ in range(len(batch)):
+                # 다음 배치로 넘긴 작업은 아직 끝나지 않았다(load_inv가 join으로 기다린다)
+                for _ in range(len(batch) - len(carry)):
                     self._wq_inv.task_done()
 
+    def _grow_for(self, data: List[Dict]):
+        """배치가 쓰는 범위만큼 가방 시트 행/열을 늘린다(모자라면 INV_GROW_CHUNK 단위로).
+        명령 경로가 아니라 작성기 스레드에서, 해당 셀 쓰기 직전에 부른다(재생된 작업도 같은 길)."""
+        max_r = max_c = 0
+        for d in data:
+            r, c = a1_to_rowcol(d["range"])
+            max_r, max_c = max(max_r, r), max(max_c, c)
+        if max_r > self._n_rows_cap:
+            n = max(Config.INV_GROW_CHUNK, max_r - self._n_rows_cap)
+            self.inv.add_rows(n)
+            self._n_rows_cap += n
+        if max_c > self._n_cols_cap:
+            n = max(Config.INV_GROW_CHUNK, max_c - self._n_cols_cap)
+            self.inv.add_cols(n)
+            self._n_cols_cap += n
+
+    def _send_job(self, send, job: dict) -> Optional[BaseException]:
+        """작업 하나를 한 번만 보낸다(작성기 스레드에서 잠들지 않는다).
+        한도/서버 오류는 outbox에 남겨 다음 실행 때 다시 보내고, 그 밖의 오류(잘못된 범위 등)는
+        다시 보내도 똑같이 실패하므로 outbox에서 지운다."""
+        try:
+            with METRICS.attributed([job.get("cmd")]), TRACER.activate([job.get("trace")]), \
+                    TRACER.span("flush_retry"):
+                send()
+        except Exception as e:
+            if not retryable(e):
+                logging.error(f"dropping unsendable job: {e!r}")
+                self._ack([job])
+            return e
+        self._ack([job])
+        return None
+
+    def _carry_failed(self, batch: List[dict], err: BaseException) -> List[dict]:
+        """작성기에서 뜻밖의 예외가 났을 때 배치를 정리하고 다음 배치로 넘길 작업을 돌려준다.
+        기다리는 명령이 있는 작업은 실패로 돌려주고, 아직 안 나간 작업은 다시 보낸다.
+        같은 작업이 SHEETS_RETRY번 넘게 이렇게 실패하면 고쳐지지 않는 작업으로 보고 지운다."""
+        carry = []
+        for j in batch:
+            if j.get("acked"):
+                continue
+            if j.get("done") is not None:
+                self._resolve(j, err)
+                continue
+            j["fails"] = j.get("fails", 0) + 1
+            if j["fails"] <= Config.SHEETS_RETRY:
+                carry.append(j)
+                continue
+            logging.error(f"dropping job after {j['fails']} writer failures: {err!r}")
+            try:
+                self._ack([j])
+            except Exception:
+                logging.exception("outbox ack failed")  # outbox에 남아 다음 실행 때 재생된다
+        return carry
+
+    @staticmethod
+    def _resolve(job: dict, err: Optional[BaseException]):
+        fut = job.get("done")
+        if fut is None or fut.done():
+            return
+        if err is None:
+            fut.set_result(None)
+        else:
+            fut.set_exception(err)
+
     def _writer_log(self):
+        self.quota.set_priority(P_LOG)
+        carry: List[dict] = []
         while True:
-            task = self._wq_log.get()
-            if task is None:
-                break
+            if carry:
+                batch, carry = carry, []
+            else:
+                task = self._wq_log.get()
+                if task is None:
+                    break
+                batch = [task]
             try:
-                batch = self._drain_dict_jobs(self._wq_log, task, 60, 200)
+                busy = self.quota.wait_ready("write") > 0 or len(batch) > 1
+                batch = self._drain_dict_jobs(self._wq_log, batch, 60, self._batch_max(busy))
                 # 워크시트별로 묶어서 append_rows
-                buckets: Dict[str, List[List[str]]] = {"jobs":[], "purs":[], "pubr":[]}
+                buckets: Dict[str, List[dict]] = {"jobs":[], "purs":[], "pubr":[]}
                 for t in batch:
-                    buckets[t["ws"]].append(t["row"])
-                if buckets["jobs"]:
-                    try: self.jobs.append_rows(buckets["jobs"])
-                    except Exception:
-                        for r in buckets["jobs"]: self.jobs.append_row(r)
-                if buckets["purs"]:
-                    try: self.purs.append_rows(buckets["purs"])
-                    except Exception:
-                        for r in buckets["purs"]: self.purs.append_row(r)
-                if buckets["pubr"]:
-                    try: self.pubr.append_rows(buckets["pubr"])
-                    except Exception:
-                        for r in buckets["pubr"]: self.pubr.append_row(r)
-            except Exception:
+                    buckets[t["ws"]].append(t)
+                for key, jobs in buckets.items():
+                    if not jobs:
+                        continue
+                    ws = getattr(self, key)
+                    try:
+                        with METRICS.attributed(t.get("cmd") for t in jobs), \
+                                TRACER.activate(t.get("trace") for t in jobs), \
+                                TRACER.span("flush_log", sheet=key, rows=len(jobs)):
+                            ws.append_rows([t["row"] for t in jobs])
+                        self._ack(jobs)
+                    except Exception as e:
+                        if retryable(e):
+                            # 한 줄씩 보내지 않고 다음 배치(새로 쌓인 줄까지)와 합쳐 다시 보낸다
+                            logging.warning(f"{key} append deferred ({len(jobs)} rows): {e!r}")
+                            carry.extend(jobs)
+                            continue
+                        for t in jobs:
+                            err = self._send_job(lambda: ws.append_row(t["row"]), t)
+                            if err is not None:
+                                logging.error(f"{key} append failed: {err!r}")
+                                if retryable(err):
+                                    carry.append(t)
+            except Exception as e:
                 logging.exception("log writer failed")
+                carry = self._carry_failed(batch, e)
             finally:
-                for _ in range(len(batch)):
+                for _ in range(len(batch) - len(carry)):
                     self._wq_log.task_done()
 
     # ---- 레시피/공개레시피 ----
@@ -172,48 +668,133 @@ class Sheets:
         cleaned.sort()
         return "-".join(cleaned)
 
-    def find_recipe(self, ingredients: list[str]) -> Optional[tuple[str,int]]:
-        # 입력 재료 정규화
-        want = Sheets.norm_key(ingredients)
-        for r in self.rec.get_all_records():
+    def load_recipes(self):
+        """레시피/공개레시피 시트를 읽어 해시 인덱스를 다시 만든다(TTL 만료 시 또는 수동 호출).
+        시트 읽기는 잠금 없이 하고, 다 만든 인덱스만 _rec_lock 안에서 바꿔 끼운다."""
+        recipes: Dict[str, Tuple[str,int]] = {}
+        for r in self.records(self.rec):
             out = str(r.get("출력아이템","")).strip()
             if not out:
                 continue
             # 시트의 '재료키'도 정규화 (시트에 순서가 뒤죽박죽이어도 OK)
             raw_key = str(r.get("재료키","")).strip()
-            have = Sheets.norm_key(raw_key.split('-')) if raw_key else ""
-            if have == want:
-                try:
-                    qty = int(r.get("출력수량", 1))
-                except Exception:
-                    qty = 1
-                return out, qty
-        return None
+            key = Sheets.norm_key(raw_key.split('-')) if raw_key else ""
+            try:
+                qty = int(r.get("출력수량", 1))
+            except Exception:
+                qty = 1
+            recipes.setdefault(key, (out, qty))  # 같은 키가 여럿이면 위쪽 행 우선
+        # 공개레시피는 아직 못 보낸 행까지(재시작 직후 저널에 남은 발견도 이미 공개된 것)
+        pub = {str(r.get("재료키","")).strip() for r in self.records(self.pubr)}
+        pub |= {str(row[2]).strip() for row in self._pending_logs("pubr")}
+        with self._rec_lock:
+            self._recipes = recipes
+            self._pub_local -= pub  # 시트에 올라간 키는 시트 쪽이 기억한다
+            self._pub_keys = pub | self._pub_local
+            self._rec_exp = time.time() + Config.RECIPE_CACHE_TTL
+
+    def _recipes_fresh(self):
+        if time.time() > self._rec_exp:
+            with self._rec_load_lock:
+                if time.time() > self._rec_exp:  # 먼저 들어온 스레드가 이미 읽었으면 생략
+                    self.load_recipes()
+
+    def find_recipe(self, ingredients: list[str]) -> Optional[tuple[str,int]]:
+        # 입력 재료 정규화 후 인덱스 조회
+        self._recipes_fresh()
+        return self._recipes.get(Sheets.norm_key(ingredients))
 
     def public_recipe_exists(self, key: str) -> bool:
-        for r in self.pubr.get_all_records():
-            if str(r.get("재료키","")).strip() == key:
-                return True
-        return False
+        self._recipes_fresh()
+        return key in self._pub_keys
 
-    def public_recipe_append(self, out_item: str, out_qty: int, key: str, acct: str, nick: str, date: str):
-        if not self.public_recipe_exists(key):
-            self._wq_log.put({"ws": "pubr", "row": [out_item, out_qty, key, acct, nick, date]})
+    def public_recipe_append(self, out_item: str, out_qty: int, key: str, acct: str, nick: str, date: str,
+                             out: Optional[List[dict]] = None):
+        self._recipes_fresh()
+        with self._rec_lock:
+            # 확인과 등록을 한 번에: 동시에 같은 레시피를 발견해도 한 줄만 기록
+            if key in self._pub_keys:
+                return
+            self._pub_keys.add(key)
+            self._pub_local.add(key)
+        self._put_log("pubr", [out_item, out_qty, key, acct, nick, date], out)
 
     # ---- 아르바이트 기록 ----
+    def load_jobs(self):
+        """기록 시트를 한 번 훑어 오늘 아르바이트를 마친 acct 집합을 만든다."""
+        today = today_str()
+        done = {str(r.get("유저", "")).strip() for r in self._log_records("jobs")
+                if str(r.get("날짜", "")).strip() == today}
+        with self._day_lock:
+            self._jobs_done = done
+            self._day = today
+
     def job_done_today(self, acct: str, today: str) -> bool:
-        for r in self.jobs.get_all_records():
+        self._roll_day()
+        if today == self._day:
+            return acct in self._jobs_done
+        for r in self.records(self.jobs):
             if str(r.get("유저","")).strip() == acct and str(r.get("날짜","")).strip() == today:
                 return True
         return False
 
+    def job_claim(self, acct: str, today: str) -> bool:
+        """오늘 아르바이트 자리를 원자적으로 선점한다. 이미 했으면 False.
+        기록이 시트에 반영되기 전에 들어온 중복 요청도 여기서 걸러진다."""
+        self._roll_day()
+        if today != self._day:
+            return not self.job_done_today(acct, today)
+        with self._day_lock:
+            if acct in self._jobs_done:
+                return False
+            self._jobs_done.add(acct)
+            return True
+
     def job_append(self, acct: str, nick: str, date: str, reward: int):
-        self._wq_log.put({"ws": "jobs", "row": [acct, nick, date, reward]})
+        self._roll_day()
+        if date == self._day:
+            with self._day_lock:
+                self._jobs_done.add(acct)
+        self._put_log("jobs", [acct, nick, date, reward])
+
+    # ---- 날짜별 인덱스 ----
+    def _roll_day(self):
+        """KST 날짜가 바뀌었으면 날짜별 인덱스에서 지난 날짜를 정리한다."""
+        today = today_str()
+        if today == self._day:
+            return
+        with self._day_lock:
+            if today != self._day:
+                self._purs_idx = {k: v for k, v in self._purs_idx.items() if k[2] == today}
+                self._jobs_done = set()
+                self._day = today
 
     # ---- 구매 한도/기록 ----
+    def load_purchases(self):
+        """구매기록 시트를 한 번 훑어 오늘자 (acct, 아이템) 누계 인덱스를 만든다."""
+        today = today_str()
+        idx: Dict[Tuple[str,str,str], int] = {}
+        for r in self._log_records("purs"):
+            ts = str(r.get("날짜", "")).strip()
+            if not ts.startswith(today):
+                continue
+            try:
+                q = int(r.get("수량", 0))
+            except Exception:
+                continue
+            k = (str(r.get("유저", "")).strip(), str(r.get("아이템", "")).strip(), today)
+            idx[k] = idx.get(k, 0) + q
+        with self._day_lock:
+            self._purs_idx = idx
+            self._day = today
+
     def purchases_today(self, acct: str, item: str, date_prefix: str) -> int:
+        self._roll_day()
+        if date_prefix == self._day:
+            return self._purs_idx.get((acct, item, date_prefix), 0)
+        # 오늘이 아닌 날짜는 인덱스에 없으므로 시트를 직접 훑는다
         total = 0
-        for r in self.purs.get_all_records():
+        for r in self.records(self.purs):
             if (str(r.get("유저", "")).strip() == acct and
                     str(r.get("아이템", "")).strip() == item):
                 ts = str(r.get("날짜", "")).strip()  # 예: '2025-09-22 07:41:03'
@@ -224,46 +805,152 @@ class Sheets:
                         pass
         return total
 
-    def purchases_append(self, acct: str, nick: str, date_ts: str, item: str, qty: int):
-        self._wq_log.put({"ws": "purs", "row": [acct, nick, date_ts, item, qty]})
+    def purchases_append(self, acct: str, nick: str, date_ts: str, item: str, qty: int,
+                         out: Optional[List[dict]] = None):
+        self._roll_day()
+        k = (acct, item, date_ts[:10])
+        with self._day_lock:
+            self._purs_idx[k] = self._purs_idx.get(k, 0) + int(qty)
+        self._put_log("purs", [acct, nick, date_ts, item, qty], out)
 
     # ---- 가챠 테이블 ----
+    def load_gacha(self):
+        """가챠 시트를 읽어 테이블별로 묶는다. 스크립트/메시지는 service에서 처리(폴백)."""
+        with self._gacha_lock:
+            tables: Dict[str, List[Dict]] = {}
+            for r in self.records(self.gacha):
+                name = str(r.get("테이블", "")).strip()
+                if name:
+                    tables.setdefault(name, []).append(r)
+            self._gacha = tables
+            self._gacha_exp = time.time() + Config.GACHA_CACHE_TTL
+
+    def gacha_tables(self) -> Dict[str, List[Dict]]:
+        """TTL 안이면 같은 dict 객체를 돌려준다(객체가 바뀌면 다시 읽은 것)."""
+        if time.time() > self._gacha_exp:
+            with self._gacha_lock:
+                if time.time() > self._gacha_exp:
+                    self.load_gacha()
+        return self._gacha
+
     def gacha_table(self, table_name: str) -> List[Dict]:
-        rows = []
-        for r in self.gacha.get_all_records():
-            if str(r.get("테이블", "")).strip() == table_name:
-                rows.append(r)  # 스크립트/메시지는 service에서 처리(폴백)
-        return rows
+        return self.gacha_tables().get(table_name, [])
+
+    # ---- 유저목록 ----
+    def load_users(self):
+        """유저목록 시트를 한 번 읽어 acct -> 행 인덱스를 만든다.
+        sqlite 모드면 로컬 users 테이블이 원본: 기억해 둔 행 번호 위에 시트에서 읽은 행을 덮고,
+        시트를 못 읽으면 로컬만으로 버틴다. 로컬에만 있고 행이 없는 유저는 다시 추가 대기열로."""
+        local = self.store.users() if self.store is not None else []
+        rows: Dict[str,int] = {a: r for a, _, _, _, r in local if r}
+        try:
+            recs = self.records(self.users, fresh=0)
+        except Exception:
+            if self.store is None:
+                raise
+            logging.warning("user list read failed, using local users")
+            recs = []
+        sheet_rows: Dict[str,int] = {}
+        for i, rec in enumerate(recs, start=2):
+            a = str(rec.get("아이디", "")).strip()
+            if a:
+                sheet_rows.setdefault(a, i)
+        rows.update(sheet_rows)
+        if self.store is not None:
+            self.store.set_user_rows(sheet_rows)
+        with self._user_lock:
+            self._user_row = rows
+            for a, nick, first, last, _ in local:
+                if a not in rows and a not in self._user_adding:
+                    self._user_new.setdefault(a, (nick, first, last))
 
     def upsert_user(self, acct: str, nick: str, ts: str):
-        if not hasattr(self, "_user_row"):
-            self._user_row = {}
-        # 캐시에 있으면 최근활동/닉네임만 갱신
-        if acct in self._user_row:
-            r = self._user_row[acct]
-            self.users.update(f"B{r}:D{r}", [[nick, "", ts]])
-            return
-        # 시트 스캔(최초 1회)
-        for i, rec in enumerate(self.users.get_all_records(), start=2):
-            if str(rec.get("아이디", "")).strip() == acct:
-                self._user_row[acct] = i
-                self.users.update(f"B{i}:D{i}", [[nick, "", ts]])
-                return
-        # 신규
-        self.users.append_row([acct, nick, ts, ts])
-        self._user_row[acct] = len(self.users.get_all_values())
+        """최근활동/닉네임 갱신을 메모리에 기록만 한다(API 호출 없음). 전송은 _writer_users가 모아서."""
+        if self.store is not None:
+            self.store.upsert_user(acct, nick, ts)
+        with self._user_lock:
+            if acct in self._user_row or acct in self._user_adding:
+                self._user_dirty[acct] = (nick, ts)
+            elif acct in self._user_new:
+                self._user_new[acct] = (nick, self._user_new[acct][1], ts)
+            else:
+                self._user_new[acct] = (nick, ts, ts)
 
     def user_exists(self, acct: str) -> bool:
         """유저목록 시트에 acct가 실제로 존재하면 True.
         (없으면 새로 만들지 않음 — 오탈자 방지용)"""
-        # 캐시에 있으면 있음
-        if hasattr(self, "_user_row") and acct in self._user_row:
-            return True
-        # 시트 스캔
-        for i, rec in enumerate(self.users.get_all_records(), start=2):
+        # 캐시(전송 대기 중인 신규 포함)에 있으면 있음
+        with self._user_lock:
+            if acct in self._user_row or acct in self._user_new or acct in self._user_adding:
+                return True
+        # 운영자가 시트에 직접 추가했을 수 있으니 시트 스캔
+        for i, rec in enumerate(self.records(self.users), start=2):
             if str(rec.get("아이디", "")).strip() == acct:
-                if not hasattr(self, "_user_row"):
-                    self._user_row = {}
-                self._user_row[acct] = i
+                with self._user_lock:
+                    self._user_row.setdefault(acct, i)
                 return True
-        return False
\ No newline at end of file
+        return False
+
+    def _writer_users(self):
+        self.quota.set_priority(P_USERS)
+        while True:
+            time.sleep(Config.USER_FLUSH_SEC)
+            try:
+                self.flush_users()
+            except Exception:
+                logging.exception("user writer failed")
+
+    @staticmethod
+    def _append_start(resp) -> Optional[int]:
+        # append 응답의 updatedRange('유저목록'!A12:D14)에서 시작 행을 뽑는다
+        try:
+            a1 = resp["updates"]["updatedRange"].split("!")[-1].split(":")[0]
+            return int(re.sub(r"[^0-9]", "", a1))
+        except Exception:
+            return None
+
+    def flush_users(self):
+        # 1) 신규 유저: append_rows 한 번
+        with self._user_lock:
+            new, self._user_new = self._user_new, {}
+            self._user_adding.update(new)
+        if new:
+            rows = [[a, nick, first, last] for a, (nick, first, last) in new.items()]
+            try:
+                start = self._append_start(self.users.append_rows(rows))
+            except Exception:
+                logging.exception("user append failed")
+                with self._user_lock:
+                    for a, v in new.items():
+                        self._user_adding.pop(a, None)
+                        self._user_new.setdefault(a, v)
+            else:
+                if start is None:
+                    self.load_users()  # 행 번호를 알 수 없으면 다시 읽는다
+                with self._user_lock:
+                    for i, a in enumerate(new):
+                        if start is not None:
+                            self._user_row[a] = start + i
+                        self._user_adding.pop(a, None)
+                if start is not None and self.store is not None:
+                    self.store.set_user_rows({a: start + i for i, a in enumerate(new)})
+
+        # 2) 기존 유저: 닉네임(B)/최근활동(D)을 batch_update 한 번 (최초활동 C는 건드리지 않음)
+        with self._user_lock:
+            dirty = {a: v for a, v in self._user_dirty.items() if a in self._user_row}
+            for a in dirty:
+                del self._user_dirty[a]
+            rows_of = {a: self._user_row[a] for a in dirty}
+        if dirty:
+            data = []
+            for a, (nick, ts) in dirty.items():
+                r = rows_of[a]
+                data.append({"range": f"B{r}", "values": [[nick]]})
+                data.append({"range": f"D{r}", "values": [[ts]]})
+            try:
+                self.users.batch_update(data)
+            except Exception:
+                logging.exception("user update failed")
+                with self._user_lock:
+                    for a, v in dirty.items():
+                        self._user_dirty.setdefault(a, v)
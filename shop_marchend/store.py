@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import json, sqlite3, threading, time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells     (r INTEGER NOT NULL, c INTEGER NOT NULL, v TEXT NOT NULL, PRIMARY KEY (r, c));
+CREATE TABLE IF NOT EXISTS logs      (id INTEGER PRIMARY KEY AUTOINCREMENT, ws TEXT NOT NULL, row TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users     (acct TEXT PRIMARY KEY, nick TEXT, first TEXT, last TEXT, row INTEGER);
+CREATE TABLE IF NOT EXISTS snapshots (name TEXT PRIMARY KEY, data TEXT NOT NULL, ts REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS outbox    (id INTEGER PRIMARY KEY AUTOINCREMENT, q TEXT NOT NULL, job TEXT NOT NULL);
+"""
+
+class LocalStore:
+    """로컬 SQLite 기본 저장소.
+    가방 셀·기록 행·유저를 여기에 먼저 커밋하고, 시트로 보낼 작업은 같은 트랜잭션에서 outbox에 남긴다.
+    outbox 행은 시트 반영이 끝나야 지워지므로, 재시작하면 남은 작업부터 다시 보낸다.
+    기록 행·유저는 여기서 다시 읽어 인덱스를 만든다(시트를 못 읽어도, 이번 실행에 쓴 행까지 포함).
+    레시피/가챠/상점 등 읽기 전용 시트는 마지막으로 읽은 내용을 스냅샷으로 보관한다."""
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+            cols = {r[1] for r in self._db.execute("PRAGMA table_info(users)")}
+            if "row" not in cols:  # 예전 스키마: 시트 행 번호 열 추가
+                self._db.execute("ALTER TABLE users ADD COLUMN row INTEGER")
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # ---- 쓰기 + outbox ----
+    def put_cells(self, cells: Iterable[Tuple[int, int, str]], job: dict,
+                  logs: Iterable[dict] = ()) -> Tuple[int, List[int]]:
+        """가방 셀과 그 명령의 기록 행({"ws","row"})을 한 트랜잭션으로. (셀 outbox id, 기록 행 outbox id들)."""
+        with self._tx() as db:
+            db.executemany("INSERT OR REPLACE INTO cells (r, c, v) VALUES (?, ?, ?)", list(cells))
+            oid = db.execute("INSERT INTO outbox (q, job) VALUES ('inv', ?)",
+                             (json.dumps(job, ensure_ascii=False),)).lastrowid
+            return oid, [self._insert_log(db, l["ws"], l["row"]) for l in logs]
+
+    @staticmethod
+    def _insert_log(db, ws: str, row: list) -> int:
+        db.execute("INSERT INTO logs (ws, row) VALUES (?, ?)", (ws, json.dumps(row, ensure_ascii=False)))
+        return db.execute("INSERT INTO outbox (q, job) VALUES ('log', ?)",
+                          (json.dumps({"ws": ws, "row": row}, ensure_ascii=False),)).lastrowid
+
+    def put_log(self, ws: str, row: list) -> int:
+        with self._tx() as db:
+            return self._insert_log(db, ws, row)
+
+    # ---- 기록 행 ----
+    def has_logs(self, ws: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM logs WHERE ws = ? LIMIT 1", (ws,)).fetchone() is not None
+
+    def logs(self, ws: str) -> List[list]:
+        with self._lock:
+            cur = self._db.execute("SELECT row FROM logs WHERE ws = ? ORDER BY id", (ws,))
+            return [json.loads(r) for (r,) in cur.fetchall()]
+
+    def seed_logs(self, ws: str, rows: List[list]):
+        """시트에 이미 있는 행을 가져온다(outbox 없이). 처음 sqlite 모드로 띄울 때 한 번."""
+        with self._tx() as db:
+            db.executemany("INSERT INTO logs (ws, row) VALUES (?, ?)",
+                           [(ws, json.dumps(r, ensure_ascii=False)) for r in rows])
+
+    def ack(self, ids: Iterable[int]):
+        ids = [(i,) for i in ids if i is not None]
+        if ids:
+            with self._tx() as db:
+                db.executemany("DELETE FROM outbox WHERE id = ?", ids)
+
+    def pending(self, q: str) -> List[Tuple[int, dict]]:
+        with self._lock:
+            cur = self._db.execute("SELECT id, job FROM outbox WHERE q = ? ORDER BY id", (q,))
+            return [(i, json.loads(j)) for i, j in cur.fetchall()]
+
+    def has_pending(self, q: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM outbox WHERE q = ? LIMIT 1", (q,)).fetchone() is not None
+
+    # ---- 가방 격자 ----
+    def has_grid(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM cells LIMIT 1").fetchone() is not None
+
+    def grid(self) -> List[List[str]]:
+        with self._lock:
+            cells = self._db.execute("SELECT r, c, v FROM cells").fetchall()
+        if not cells:
+            return []
+        n_r = max(r for r, _, _ in cells)
+        n_c = max(c for _, c, _ in cells)
+        out = [[""] * n_c for _ in range(n_r)]
+        for r, c, v in cells:
+            out[r - 1][c - 1] = v
+        return out
+
+    def replace_grid(self, grid: List[List[str]]):
+        cells = [(r, c, str(v)) for r, line in enumerate(grid, 1) for c, v in enumerate(line, 1) if str(v) != ""]
+        with self._tx() as db:
+            db.execute("DELETE FROM cells")
+            db.executemany("INSERT INTO cells (r, c, v) VALUES (?, ?, ?)", cells)
+
+    # ---- 유저 ----
+    def upsert_user(self, acct: str, nick: str, ts: str):
+        with self._tx() as db:
+            db.execute("INSERT INTO users (acct, nick, first, last) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT(acct) DO UPDATE SET nick = excluded.nick, last = excluded.last",
+                       (acct, nick, ts, ts))
+
+    def users(self) -> List[Tuple[str, str, str, str, Optional[int]]]:
+        """(acct, 닉네임, 최초활동, 최근활동, 유저목록 시트 행 또는 None)."""
+        with self._lock:
+            return self._db.execute("SELECT acct, nick, first, last, row FROM users").fetchall()
+
+    def set_user_rows(self, rows: Dict[str, int]):
+        if rows:
+            with self._tx() as db:
+                db.executemany("UPDATE users SET row = ? WHERE acct = ?", [(r, a) for a, r in rows.items()])
+
+    # ---- 읽기 전용 시트 스냅샷 ----
+    def snapshot_put(self, name: str, recs: List[Dict]):
+        with self._tx() as db:
+            db.execute("INSERT OR REPLACE INTO snapshots (name, data, ts) VALUES (?, ?, ?)",
+                       (name, json.dumps(recs, ensure_ascii=False), time.time()))
+
+    def snapshot_get(self, name: str) -> Optional[List[Dict]]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM snapshots WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
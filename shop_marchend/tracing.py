@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""멘션 하나의 처리 과정을 스레드를 넘어 잇는 추적.
+
+on_notif에서 Trace를 만들고(status id로 찾을 수 있게 보관), 명령 스레드·쓰기 큐 작업·답변 힙 항목이
+그 Trace를 들고 다닌다. 어느 스레드든 activate(트레이스들) 안에서 span()을 열면 그 모두에 구간이 남는다.
+시트/마스토돈 API 호출 구간은 metrics의 대리 객체가 자동으로 남긴다.
+첫 답글이 게시되면 끝나고, TRACE_SLOW_SEC 이상 걸렸거나 TRACE_SAMPLE 확률에 걸리면 TRACE_FILE에 한 줄(JSON)로 쓴다.
+TRACE_PROFILE을 켜면 명령 처리를 cProfile로 떠 두었다가 느린 것만 <TRACE_FILE>.prof/<id>.prof 로 남긴다."""
+import cProfile, itertools, json, logging, os, random, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+from .config import Config
+
+_LIVE_MAX = 10000   # 아직 답글이 안 나간 추적을 이만큼까지만 들고 있는다
+
+class Trace:
+    _ids = itertools.count(1)
+
+    def __init__(self, status_id: str, acct: str, t0: Optional[float] = None):
+        self.id = f"{os.getpid():x}-{next(Trace._ids):x}"
+        self.status_id = status_id
+        self.acct = acct
+        self.cmd: Optional[str] = None
+        self.t0 = time.monotonic() if t0 is None else t0     # 알림을 받은 시각
+        self.wall = time.time() - (time.monotonic() - self.t0)
+        self.t_submit = self.t0                               # 레인에 넣은 시각
+        self.spans: List[dict] = []
+        self.done = False
+        self.prof: Optional[cProfile.Profile] = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, **attrs):
+        """monotonic 시각 start~end 구간을 남긴다."""
+        sp = {"name": name, "at": round(start - self.t0, 6), "dur": round(end - start, 6),
+              "thread": threading.current_thread().name}
+        if attrs:
+            sp.update(attrs)
+        with self._lock:
+            if not self.done:
+                self.spans.append(sp)
+
+    def to_json(self, total: float) -> str:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["at"])
+        return json.dumps({"trace": self.id, "status": self.status_id, "acct": self.acct, "cmd": self.cmd,
+                           "start": self.wall, "total": round(total, 6), "spans": spans}, ensure_ascii=False)
+
+
+class Tracer:
+    def __init__(self):
+        self._tls = threading.local()
+        self._live: "OrderedDict[str, Trace]" = OrderedDict()   # status id -> Trace
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(Config.TRACE_FILE)
+
+    # ---- 생성/조회 ----
+    def start(self, status_id, acct: str, t0: Optional[float] = None) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        tr = Trace(str(status_id), acct, t0)
+        with self._lock:
+            self._live[tr.status_id] = tr
+            while len(self._live) > _LIVE_MAX:
+                self._live.popitem(last=False)
+        return tr
+
+    def get(self, status_id) -> Optional[Trace]:
+        if status_id is None:
+            return None
+        with self._lock:
+            return self._live.get(str(status_id))
+
+    def current(self) -> Optional[Trace]:
+        trs = getattr(self._tls, "traces", None)
+        return trs[0] if trs else None
+
+    # ---- 스레드에 걸기 / 구간 ----
+    @contextmanager
+    def activate(self, traces: Iterable[Optional[Trace]]):
+        prev = getattr(self._tls, "traces", None)
+        self._tls.traces = [t for t in traces if t is not None] or None
+        try:
+            yield
+        finally:
+            self._tls.traces = prev
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        trs = getattr(self._tls, "traces", None)
+        if not trs:
+            yield
+            return
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            t1 = time.monotonic()
+            for tr in trs:
+                tr.add(name, t0, t1, **attrs)
+
+    def record(self, name: str, start: float, end: float, **attrs):
+        """이미 지난 구간(start~end, monotonic)을 이 스레드에 걸린 추적들에 남긴다."""
+        trs = getattr(self._tls, "traces", None)
+        if trs:
+            for tr in trs:
+                tr.add(name, start, end, **attrs)
+
+    def mark(self, name: str, **attrs):
+        """길이 없는 사건(큐에 넣음 등)."""
+        now = time.monotonic()
+        self.record(name, now, now, **attrs)
+
+    # ---- 프로파일 ----
+    @contextmanager
+    def profiled(self, tr: Optional[Trace]):
+        if tr is None or not Config.TRACE_PROFILE:
+            yield
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # 이 스레드에 이미 다른 프로파일러가 붙어 있음
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            tr.prof = prof
+
+    # ---- 끝 ----
+    def finish(self, tr: Optional[Trace]):
+        """첫 답글이 나갔을 때. 느리거나 표본에 걸린 것만 파일로 남긴다."""
+        if tr is None or tr.done:
+            return
+        total = time.monotonic() - tr.t0
+        with self._lock:
+            if self._live.get(tr.status_id) is tr:
+                del self._live[tr.status_id]
+        line = tr.to_json(total)
+        tr.done = True
+        slow = total >= Config.TRACE_SLOW_SEC
+        if not slow and random.random() >= Config.TRACE_SAMPLE:
+            return
+        try:
+            with self._file_lock:
+                with open(Config.TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            if slow and tr.prof is not None:
+                d = Config.TRACE_FILE + ".prof"
+                os.makedirs(d, exist_ok=True)
+                tr.prof.dump_stats(os.path.join(d, f"{tr.id}.prof"))
+        except OSError:
+            logging.exception("trace write failed")
+        if slow:
+            logging.info(f"slow reply {total:.1f}s trace={tr.id} status={tr.status_id} cmd={tr.cmd}")
+
+
+TRACER = Tracer()
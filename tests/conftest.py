@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from shop_marchend.config import Config
+
+
+@pytest.fixture(autouse=True)
+def _config(monkeypatch, tmp_path):
+    # 테스트마다 디스크 파일(저널/sqlite)은 임시 폴더로, 시트 한도/백오프는 짧게.
+    # 저장 방식은 운영 기본값 그대로(시트 + 쓰기 저널)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, "STORE", "sheets")
+    monkeypatch.setattr(Config, "SHEETS_READ_PER_MIN", 0)
+    monkeypatch.setattr(Config, "SHEETS_WRITE_PER_MIN", 0)
+    monkeypatch.setattr(Config, "SHEETS_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(Config, "SHEETS_BACKOFF_MAX", 0.02)
+
+
+@pytest.fixture
+def make_shop():
+    """가방(유저 a: 100코인, 사과 3개)만 채운 가짜 문서로 (문서, Sheets, ShopService)를 띄운다.
+    ss를 넘기면 그 문서로 다시 띄운다(재시작 흉내)."""
+    from shop_marchend.fakes import FakeSpreadsheet
+    from shop_marchend.sheets import Sheets
+    from shop_marchend.service import ShopService
+
+    def make(ss=None):
+        if ss is None:
+            ss = FakeSpreadsheet()
+            ss.add_worksheet(Config.WS_INV, rows=1000, cols=26).fill(
+                [["아이템명", "a"], [Config.CURRENCY, 100], ["사과", 3]])
+        sh = Sheets(ss=ss)
+        return ss, sh, ShopService(sh)
+    return make
+
+
+@pytest.fixture
+def shop(make_shop):
+    return make_shop()
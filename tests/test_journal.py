@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+
+from shop_marchend.journal import Journal
+
+
+def _inv(rng, v, **extra):
+    return dict({"data": [{"range": rng, "values": [[v]]}]}, **extra)
+
+
+def test_replays_unacked_jobs_in_order(tmp_path):
+    path = str(tmp_path / "j.log")
+    j = Journal(path)
+    a = j.put("inv", _inv("B2", "1"))
+    b = j.put("log", {"ws": "purs", "row": ["a"]})
+    c = j.put("inv", _inv("B3", "2"))
+    j.ack([b])
+    j._fh.flush()  # ack 줄은 fsync하지 않는다(잃으면 한 번 더 보낼 뿐)
+
+    j2 = Journal(path)
+    assert j2.pending("inv") == [(a, _inv("B2", "1")), (c, _inv("B3", "2"))]
+    assert j2.pending("log") == []
+    assert j2.put("inv", _inv("B4", "3")) > c  # id는 이어서 증가
+
+
+def test_truncates_when_everything_is_acked(tmp_path):
+    path = str(tmp_path / "j.log")
+    j = Journal(path)
+    ids = [j.put("inv", _inv("B2", str(i))) for i in range(3)]
+    j.ack(ids[:2])
+    assert os.path.getsize(path) > 0
+    j.ack(ids[2:])
+    assert os.path.getsize(path) == 0
+    assert not j.has_pending("inv")
+    assert Journal(path).pending("inv") == []
+
+
+def test_drops_half_written_tail(tmp_path):
+    path = str(tmp_path / "j.log")
+    j = Journal(path)
+    a = j.put("inv", _inv("B2", "1"))
+    j._fh.write('{"i": 2, "q": "inv", "job": {"da')
+    j._fh.flush()
+
+    j2 = Journal(path)
+    assert [i for i, _ in j2.pending("inv")] == [a]
+    b = j2.put("inv", _inv("B3", "2"))
+    assert [i for i, _ in Journal(path).pending("inv")] == [a, b]
+
+
+def test_compaction_keeps_latest_values_and_logs(tmp_path):
+    path = str(tmp_path / "j.log")
+    j = Journal(path, compact_n=100)
+    logs = [{"ws": "purs", "row": ["a", "A", "2026-01-01 00:00:00", "사과", 1]}]
+    stuck = j.put("inv", _inv("B2", "1", logs=logs), sync=False)
+    for i in range(150):
+        j.ack([j.put("inv", _inv("B2", str(i + 2)), sync=False)])
+    assert j._lines <= 100 + 1
+
+    (i, job), = Journal(path).pending("inv")
+    assert i == stuck
+    assert job["data"] == [{"range": "B2", "values": [["151"]]}]
+    assert job["logs"] == logs
+
+
+def test_linked_pieces_ack_separately(tmp_path):
+    path = str(tmp_path / "j.log")
+    j = Journal(path)
+    logs = [{"ws": "purs", "row": ["a"]}, {"ws": "pubr", "row": ["b"]}]
+    a = j.put("inv", _inv("B2", "1", logs=logs))
+    assert j.has_pending("inv")
+    j.ack([], [(a, "data")])
+    assert not j.has_pending("inv")  # 셀은 나갔다: 기록 행만 남은 작업은 가방 재적재를 막지 않는다
+    j.ack([], [(a, 1)])
+    j._fh.flush()
+
+    (i, job), = Journal(path).pending("inv")
+    assert i == a and sorted(map(str, job["sent"])) == ["1", "data"]
+    j.ack([], [(a, 0)])
+    assert os.path.getsize(path) == 0
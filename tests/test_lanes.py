@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import threading, time
+
+from shop_marchend.lanes import Lanes
+
+
+def _drain(lanes: Lanes, keys):
+    done = threading.Event()
+    lanes.submit(keys, done.set)
+    assert done.wait(5)
+
+
+def test_same_key_runs_in_submit_order():
+    lanes = Lanes(4)
+    out = []
+    for i in range(50):
+        lanes.submit(["a"], lambda i=i: (time.sleep(0.001 * (i % 3)), out.append(i)))
+    _drain(lanes, ["a"])
+    assert out == list(range(50))
+
+
+def test_multi_lane_task_runs_once_between_neighbours():
+    lanes = Lanes(8)
+    a, b = "a", next(k for k in map(str, range(100)) if lanes.lane_of(k) != lanes.lane_of("a"))
+    out = []
+    release = threading.Event()
+    lanes.submit([a], lambda: (release.wait(5), out.append("a1")))
+    lanes.submit([b], lambda: out.append("b1"))
+    lanes.submit([a, b], lambda: out.append("ab"))
+    lanes.submit([b], lambda: out.append("b2"))
+    time.sleep(0.05)
+    assert out == ["b1"]  # b 레인은 a 레인이 관문에 올 때까지 멈춘다
+    release.set()
+    _drain(lanes, [a, b])
+    assert out == ["b1", "a1", "ab", "b2"]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import time
+
+from shop_marchend.fakes import FakeMastodon
+from shop_marchend.main import wait_connected
+
+
+class _NeverConnects:
+    # 첫 연결이 안 되면 Mastodon.py 핸들은 connection 없이 계속 재시도한다
+    connection = None
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connect_wait_gives_up_and_closes_the_handle():
+    h = _NeverConnects()
+    t0 = time.monotonic()
+    assert not wait_connected(h, 0.2)
+    assert h.closed
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_connect_wait_returns_once_connected():
+    h = FakeMastodon().stream_user(object(), run_async=True)
+    assert wait_connected(h, 5)
+    assert not h.closed
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""한 번에 훑는 Parser가 예전 파서(명령마다 정규식 하나, 정해진 순서로 검사)와 같은 답을 내는지."""
+import random, re
+
+import pytest
+
+from shop_marchend.commands import Parser
+
+
+class LegacyParser:
+    RE_BUY    = re.compile(r"\[\s*구매\s*/\s*([^\]]+)\]")
+    RE_USE    = re.compile(r"\[\s*사용\s*/\s*([^\]]+)\]")
+    RE_SELL   = re.compile(r"\[\s*판매\s*/\s*([^\]]+)\]")
+    RE_GIVE   = re.compile(r"\[\s*양도\s*/\s*([^:\]]+)\s*:\s*([^:\]]+)\s*:\s*(\d+)\s*\]")
+    RE_CRAFT  = re.compile(r"\[\s*제작\s*/\s*([^\]]+)\]")
+    RE_JOB    = re.compile(r"\[\s*아르바이트\s*\]")
+    RE_STATUS = re.compile(r"\[\s*상태\s*\]")
+
+    def has_command(self, t):
+        return any(r.search(t) for r in (self.RE_BUY, self.RE_USE, self.RE_SELL, self.RE_GIVE,
+                                         self.RE_CRAFT, self.RE_JOB, self.RE_STATUS))
+
+    def parse(self, t):
+        m = self.RE_BUY.search(t)
+        if m:
+            return {"cmd": "buy", "items": Parser.parse_item_list(m.group(1))}
+        m = self.RE_USE.search(t)
+        if m:
+            return {"cmd": "use", "item": m.group(1).strip()}
+        m = self.RE_SELL.search(t)
+        if m:
+            return {"cmd": "sell", "items": Parser.parse_item_list(m.group(1))}
+        m = self.RE_GIVE.search(t)
+        if m:
+            return {"cmd": "give", "target": m.group(1).strip(), "thing": m.group(2).strip(), "qty": int(m.group(3))}
+        m = self.RE_CRAFT.search(t)
+        if m:
+            return {"cmd": "craft", "ings": [p.strip() for p in m.group(1).split('-') if p.strip()]}
+        if self.RE_JOB.search(t):
+            return {"cmd": "job"}
+        if self.RE_STATUS.search(t):
+            return {"cmd": "status"}
+        return {"cmd": "unknown"}
+
+
+def _as_dict(cmd):
+    if cmd is None:
+        return {"cmd": "unknown"}
+    return dict(cmd._asdict(), cmd=type(cmd).__name__.lower())
+
+
+CASES = [
+    "@shop [구매/사과*2-배x3- 귤 ]",
+    "@shop [ 사용 / 물약 ]",
+    "@shop [판매/사과]",
+    "@shop [양도/친구 : 사과 : 3 ]",
+    "@shop [양도/친구:사과:셋]",
+    "@shop [제작/밀-물-소금]",
+    "@shop [아르바이트] [상태]",
+    "@shop [상태]",
+    "@shop [상태] [구매/사과]",
+    "@shop [사용/[구매/사과]",
+    "@shop [양도/a:b:1] [판매/c]",
+    "@shop 안녕하세요 [구매/]",
+    "@shop [구매/사과",
+    "@shop 명령 없음",
+    "",
+]
+
+_SNIPPETS = ["[구매/사과*2-배]", "[사용/물약]", "[판매/사과x3]", "[양도/친구:사과:3]", "[제작/밀-물]",
+             "[아르바이트]", "[상태]", "@shop ", "안녕 ", "[", "]"]
+_NOISE = ["[", "]", "/", ":", "-", " ", "x", "*", "1", "가"]
+
+
+def _fuzz(n, seed=20):
+    # 멀쩡한 명령 몇 개를 이어 붙이고 글자를 지우거나 끼워 넣어 흔든다
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        t = list("".join(rnd.choice(_SNIPPETS) for _ in range(rnd.randint(1, 4))))
+        for _ in range(rnd.randint(0, 3)):
+            i = rnd.randrange(len(t) + 1)
+            if rnd.random() < 0.5 and i < len(t):
+                del t[i]
+            else:
+                t.insert(i, rnd.choice(_NOISE))
+        out.append("".join(t))
+    return out
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_matches_legacy_parser(text):
+    old, new = LegacyParser(), Parser()
+    assert new.has_command(text) == old.has_command(text)
+    assert _as_dict(new.parse(text)) == old.parse(text)
+
+
+def test_matches_legacy_parser_on_fuzzed_input():
+    old, new = LegacyParser(), Parser()
+    for text in _fuzz(20000):
+        assert new.has_command(text) == old.has_command(text), text
+        assert _as_dict(new.parse(text)) == old.parse(text), text
+
+
+def test_clean_html():
+    assert Parser.clean_html("<p>@<span>shop</span> [상태]</p>") == "@ shop  [상태]"
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os, threading, time
+
+import pytest
+
+from shop_marchend.config import Config
+from shop_marchend.fakes import FakeAPIError
+from shop_marchend.quota import Quota, retryable
+
+
+class Flaky:
+    def __init__(self, codes):
+        self.codes = list(codes)
+        self.n = 0
+
+    def __call__(self):
+        self.n += 1
+        if self.codes:
+            raise FakeAPIError(self.codes.pop(0))
+        return "ok"
+
+
+def test_429_backs_off_and_retries():
+    q = Quota(0, 0)
+    fn = Flaky([429, 503])
+    t0 = time.monotonic()
+    assert q.call("write", "batch_update", fn) == "ok"
+    assert fn.n == 3
+    assert time.monotonic() - t0 >= Config.SHEETS_BACKOFF_BASE / 2  # 지터 하한
+    assert q.write.fails == 0  # 성공하면 백오프 단계 초기화
+    assert q.read.blocked_until == 0.0  # 다른 버킷은 막지 않는다
+
+
+def test_gives_up_after_retry_limit(monkeypatch):
+    monkeypatch.setattr(Config, "SHEETS_RETRY", 2)
+    q = Quota(0, 0)
+    fn = Flaky([429] * 10)
+    with pytest.raises(FakeAPIError):
+        q.call("read", "get_all_values", fn)
+    assert fn.n == 3
+
+
+def test_non_retryable_error_is_raised_at_once():
+    q = Quota(0, 0)
+    fn = Flaky([400])
+    with pytest.raises(FakeAPIError):
+        q.call("write", "update", fn)
+    assert fn.n == 1
+    assert not retryable(FakeAPIError(400)) and retryable(FakeAPIError(429))
+
+
+def test_wait_ready_reports_zero_when_a_token_is_free():
+    q = Quota(60, 60)
+    assert q.wait_ready("write") == 0.0
+    q.write.tokens = 0.0
+    q.write.t = time.monotonic() - 59 / 60.0  # 곧 토큰 하나
+    assert q.wait_ready("write") > 0.0
+
+
+def test_bucket_serves_higher_priority_first():
+    q = Quota(0, 0)
+    b = q.write
+    b.blocked_until = time.monotonic() + 0.1
+    order = []
+    ts = [threading.Thread(target=lambda p=p: (b.take(p), order.append(p))) for p in (4, 0, 2)]
+    for t in ts:
+        t.start()
+        time.sleep(0.01)
+    for t in ts:
+        t.join(5)
+    assert order == [0, 2, 4]
+
+
+def test_writer_carries_job_after_400_then_429(monkeypatch, make_shop):
+    # 묶음 전송이 400이면 작업 단위로 다시 보내는데, 그 한 번이 429여도 작업은 살아남아야 한다
+    monkeypatch.setattr(Config, "SHEETS_RETRY", 0)
+    ss, sh, svc = make_shop()
+    ws = ss.sheets[Config.WS_INV]
+    fn, orig = Flaky([400, 429]), ws.batch_update
+    ws.batch_update = lambda data, **kw: (fn(), orig(data, **kw))[1]
+    svc.add_bal("a", -10)
+    sh._wq_inv.join()
+    assert not fn.codes  # 400과 429를 모두 겪었다
+    assert ws.get_all_values()[1][1] == "90"
+    assert os.path.getsize(Config.JOURNAL_FILE) == 0  # 보낸 뒤 ack
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from shop_marchend.seen import SeenStore
+
+
+def test_dedupes_across_restart(tmp_path):
+    path = str(tmp_path / "seen.log")
+    s = SeenStore(path, max_n=10)
+    assert s.add("100", "7")
+    assert not s.add("100", "8")
+    assert s.add(101)
+
+    s2 = SeenStore(path, max_n=10)
+    assert "100" in s2 and 101 in s2
+    assert not s2.add("101")
+    assert s2.last_notif == "7"
+
+
+def test_compacts_to_recent_ids(tmp_path):
+    path = str(tmp_path / "seen.log")
+    s = SeenStore(path, max_n=5)
+    for i in range(11):
+        s.add(str(i), str(1000 + i))
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 5
+    assert [l.split()[0] for l in lines] == ["6", "7", "8", "9", "10"]
+
+    s2 = SeenStore(path, max_n=5)
+    assert "5" not in s2 and "10" in s2
+    assert s2.last_notif == "1010"  # 압축해도 따라잡기 위치는 남는다
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import random
+from collections import Counter
+
+import pytest
+
+from shop_marchend.config import Config
+from shop_marchend.fakes import FakeAPIError
+from shop_marchend.service import AliasSampler
+from shop_marchend.utils_time import now_ts, today_str
+
+
+def test_txn_reverts_matrix_when_flush_fails(monkeypatch, make_shop):
+    monkeypatch.setattr(Config, "JOURNAL_FILE", "")  # 저널이 없을 때만 커밋이 시트 반영을 기다린다
+    ss, sh, svc = make_shop()
+    inv = ss.sheets[Config.WS_INV]
+
+    def broken(data, **kw):
+        raise FakeAPIError(400, "bad range")
+    inv.batch_update = broken
+
+    tx = svc.txn()
+    tx.add_bal("a", -30)
+    tx.remove_item("a", "사과", 2)
+    tx.record_purchase("a", "A", "사과", 2, "2026-01-01 00:00:00")
+    with pytest.raises(FakeAPIError):
+        tx.commit()
+
+    assert svc.balance("a") == 100
+    assert sh.read_int(sh.row_of("사과"), sh.ensure_user("a")) == 3
+    sh._wq_log.join()
+    assert ss.sheets[Config.WS_PURCHASE].get_all_values()[1:] == []  # 기록 행도 나가지 않는다
+
+
+def test_txn_rejects_overdraw_without_changes(shop):
+    ss, sh, svc = shop
+    tx = svc.txn()
+    tx.add_bal("a", -10)
+    tx.remove_item("a", "사과", 4)
+    tx.record_purchase("a", "A", "사과", 4, now_ts())
+    with pytest.raises(ValueError):
+        tx.commit()
+    assert svc.balance("a") == 100
+    assert sh.purchases_today("a", "사과", today_str()) == 0  # 기록도 남지 않는다
+
+
+def test_txn_zero_quantity_is_a_no_op(shop):
+    _, _, svc = shop
+    tx = svc.txn()
+    tx.add_item("a", "없는아이템", 0)
+    tx.remove_item("a", "없는아이템", 0)
+    assert tx.deltas == {}
+
+
+def test_alias_sampler_matches_weights():
+    random.seed(7)
+    s = AliasSampler(["a", "b", "c", "d"], [1, 2, 3, 0])
+    n = 60000
+    got = Counter(s.draw() for _ in range(n))
+    assert "d" not in got
+    for k, w in (("a", 1), ("b", 2), ("c", 3)):
+        assert abs(got[k] / n - w / 6) < 0.01
+
+
+def test_alias_sampler_falls_back_to_uniform():
+    random.seed(7)
+    s = AliasSampler(["x", "y"], [0, 0])
+    got = Counter(s.draw() for _ in range(10000))
+    assert abs(got["x"] / 10000 - 0.5) < 0.03
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import os, queue, threading, time
+
+from shop_marchend.config import Config
+from shop_marchend.fakes import FakeAPIError
+from shop_marchend.utils_time import now_ts, today_str
+
+
+def _slow(ws, sec):
+    orig = ws.get_all_records
+
+    def slow(*a, **kw):
+        time.sleep(sec)
+        return orig(*a, **kw)
+    ws.get_all_records = slow
+
+
+def test_recipe_reload_does_not_block_inventory_writes(shop):
+    ss, sh, svc = shop
+    _slow(ss.sheets[Config.WS_PUBLIC_REC], 1.0)
+    sh._rec_exp = 0.0  # 레시피 TTL 만료
+
+    def craft():
+        with svc.txn() as tx:
+            tx.remove_item("a", "사과", 1)
+            tx.add_item("a", "빵", 1)
+            tx.record_public_recipe("빵", 1, "사과", "a", "A", today_str())
+
+    threads = [threading.Thread(target=sh.find_recipe, args=(["사과"],)), threading.Thread(target=craft)]
+    for t in threads:
+        t.start()
+        time.sleep(0.1)
+    t0 = time.monotonic()
+    svc.add_bal("b", 10)  # 재적재와 상관없는 가방 쓰기
+    assert time.monotonic() - t0 < 0.3
+    for t in threads:
+        t.join(5)
+    assert sh.public_recipe_exists("사과")
+
+
+def test_rejected_commit_forgets_its_log_rows(shop):
+    ss, sh, svc = shop
+    tx = svc.txn()
+    tx.remove_item("a", "사과", 9)
+    tx.record_purchase("a", "A", "사과", 9, now_ts())
+    tx.record_public_recipe("빵", 1, "사과-사과", "a", "A", today_str())
+    try:
+        tx.commit()
+    except ValueError:
+        pass
+    assert sh.purchases_today("a", "사과", today_str()) == 0
+    assert not sh.public_recipe_exists("사과-사과")
+
+
+def test_sqlite_commit_stores_cells_and_log_rows_together(monkeypatch, make_shop):
+    monkeypatch.setattr(Config, "STORE", "sqlite")
+    ss, sh, svc = make_shop()
+    with svc.txn() as tx:
+        tx.add_bal("a", -10)
+        tx.record_purchase("a", "A", "사과", 1, now_ts())
+    assert sh.store.logs("purs")[-1][:2] == ["a", "A"]
+
+    # 기록 행을 넣다 실패하면 셀도 같이 롤백된다
+    def broken(db, ws, row):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(type(sh.store), "_insert_log", staticmethod(broken))
+    tx = svc.txn()
+    tx.add_bal("a", -10)
+    tx.record_purchase("a", "A", "사과", 1, now_ts())
+    try:
+        tx.commit()
+    except RuntimeError:
+        pass
+    r, c = sh.row_of(Config.CURRENCY), sh.ensure_user("a")
+    assert svc.balance("a") == 90
+    assert sh.store.grid()[r - 1][c - 1] == "90"
+    assert sh.purchases_today("a", "사과", today_str()) == 1
+
+
+def _stall(q_name, sh):
+    # 그 쓰기 큐의 작성기가 더는 못 꺼내게 한다(시트 전송이 멈춘 상태 / 죽기 직전 흉내)
+    getattr(sh, q_name).join()
+    setattr(sh, q_name, queue.Queue())
+
+
+def test_journaled_txn_log_rows_survive_a_crash(make_shop):
+    ss, sh, svc = make_shop()
+    _stall("_wq_inv", sh)
+    _stall("_wq_log", sh)
+    with svc.txn() as tx:
+        tx.add_bal("a", -10)
+        tx.record_purchase("a", "A", "사과", 1, now_ts())
+        tx.record_public_recipe("빵", 1, "밀-물", "a", "A", today_str())
+
+    _, sh2, svc2 = make_shop(ss)  # 같은 문서 + 같은 저널로 다시 띄운다
+    assert svc2.balance("a") == 90
+    assert sh2.purchases_today("a", "사과", today_str()) == 1
+    assert sh2.public_recipe_exists("밀-물")
+    sh2._wq_inv.join()
+    sh2._wq_log.join()
+    assert [r[0] for r in ss.sheets[Config.WS_PURCHASE].get_all_values()[1:]] == ["a"]
+    assert [r[2] for r in ss.sheets[Config.WS_PUBLIC_REC].get_all_values()[1:]] == ["밀-물"]
+    assert ss.sheets[Config.WS_INV].get_all_values()[1][1] == "90"
+    assert os.path.getsize(Config.JOURNAL_FILE) == 0
+
+
+def test_pending_log_rows_do_not_block_inventory_reload(make_shop):
+    ss, sh, svc = make_shop()
+    _stall("_wq_log", sh)  # 구매기록 행은 아직 못 나간다
+    with svc.txn() as tx:
+        tx.add_bal("a", -10)
+        tx.record_purchase("a", "A", "사과", 1, now_ts())
+    sh._wq_inv.join()  # 셀은 시트에 나갔다
+
+    r, c = sh.row_of("사과"), sh.ensure_user("a")
+    ss.sheets[Config.WS_INV].update(f"B{r}", [[7]])  # 운영자가 시트에서 직접 고침
+    assert sh.load_inv()
+    assert sh.read_int(r, c) == 7
+    assert svc.balance("a") == 90
+
+    # 셀 조각은 이미 나갔으니 재시작해도 기록 행만 다시 보낸다
+    _, sh2, _ = make_shop(ss)
+    sh2._wq_log.join()
+    assert len(ss.sheets[Config.WS_PURCHASE].get_all_values()) == 2
+    assert sh2.read_int(r, c) == 7
+
+
+def _fail_first(ws, name, codes):
+    # ws.name이 codes 순서대로 FakeAPIError를 던진 뒤부터 원래대로 동작한다
+    orig, codes = getattr(ws, name), list(codes)
+
+    def flaky(*a, **kw):
+        if codes:
+            raise FakeAPIError(codes.pop(0))
+        return orig(*a, **kw)
+    setattr(ws, name, flaky)
+
+
+def test_journaled_txn_retries_rows_after_single_row_fallback(monkeypatch, make_shop):
+    monkeypatch.setattr(Config, "SHEETS_RETRY", 0)
+    ss, sh, svc = make_shop()
+    # 묶음 전송은 400이라 한 줄씩 보내는데, 그 한 줄이 429: 버리지 말고 다음 배치로
+    _fail_first(ss.sheets[Config.WS_PURCHASE], "append_rows", [400])
+    _fail_first(ss.sheets[Config.WS_PURCHASE], "append_row", [429])
+    with svc.txn() as tx:
+        tx.add_bal("a", -10)
+        tx.record_purchase("a", "A", "사과", 1, now_ts())
+    sh._wq_inv.join()
+    sh._wq_log.join()
+    assert [r[0] for r in ss.sheets[Config.WS_PURCHASE].get_all_values()[1:]] == ["a"]
+    assert os.path.getsize(Config.JOURNAL_FILE) == 0
+
+
+def test_writer_failure_carries_unsent_jobs(make_shop):
+    ss, sh, svc = make_shop()
+    orig, calls = sh._drain_dict_jobs, []
+
+    def broken(*a, **kw):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")  # 작성기 안의 뜻밖의 예외
+        return orig(*a, **kw)
+    sh._drain_dict_jobs = broken
+    svc.add_bal("a", -10)
+    sh._wq_inv.join()
+    assert ss.sheets[Config.WS_INV].get_all_values()[1][1] == "90"
+    assert os.path.getsize(Config.JOURNAL_FILE) == 0